@@ -0,0 +1,169 @@
+"""
+Memory profile of the price, space and floor cleaning stages of the
+features_to_tags pipelines on a synthetic frame, next to the former stages,
+which rebuilt each column with np.where(mask, None, X[col]) and so turned
+it into an object column of boxed Python floats.
+
+Every pipeline and variant runs in a fresh process, since the max RSS
+is a process-wide high-water mark.
+
+Usage, with ds_toolkit installed:
+    python benchmarks/lightfm_cleaning_memory.py [--rows 1000000]
+"""
+
+import argparse
+import multiprocessing
+import resource
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from ds_toolkit.lightfm import (
+    BuyPriceTransformer,
+    BuySpaceTransformer,
+    FloorTransformer,
+    RentPriceTransformer,
+    RentSpaceTransformer,
+)
+
+
+def _where_none(X, column, mask):
+    X[column] = np.where(mask, None, X[column])
+    return X
+
+
+def former_price_stage(transformer_class):
+    def transform(X):
+        price_cutoffs = transformer_class().fit(X).price_cutoffs_
+        return _where_none(
+            X,
+            "PRICE",
+            X["PRICE"].astype(np.float64)
+            > X["CATEGORY_CODE"].map(price_cutoffs),
+        )
+
+    return transform
+
+
+def former_rent_space_stage(X):
+    exempt = (X["CATEGORY_CODE"] == "PARK") | (
+        (X["CATEGORY_CODE"] == "INDUS") & (X["CATEGORIES"] == "DISPLAY_WINDOW")
+    )
+    return _where_none(
+        X,
+        "SPACE",
+        X["CATEGORY_CODE"].notna()
+        & X["CATEGORIES"].notna()
+        & ~exempt
+        & (X["SPACE"] <= 1),
+    )
+
+
+def former_buy_space_stage(X):
+    category, space = X["CATEGORY_CODE"], X["SPACE"]
+    return _where_none(
+        X,
+        "SPACE",
+        ((category == "APPT") & ((space > 1000) | (space <= 1)))
+        | ((category == "PARK") & (space > 100))
+        | (category.isin(["GASTRO", "HOUSE"]) & (space <= 1)),
+    )
+
+
+def former_floor_stage(X):
+    return _where_none(X, "FLOOR", X["FLOOR"] >= 50)
+
+
+def _fit_transform(transformer_class):
+    return lambda X: transformer_class().fit_transform(X)
+
+
+PIPELINES = {
+    ("BUY", "before"): [
+        former_price_stage(BuyPriceTransformer),
+        former_buy_space_stage,
+        former_floor_stage,
+    ],
+    ("BUY", "after"): [
+        _fit_transform(BuyPriceTransformer),
+        _fit_transform(BuySpaceTransformer),
+        _fit_transform(FloorTransformer),
+    ],
+    ("RENT", "before"): [
+        former_price_stage(RentPriceTransformer),
+        former_rent_space_stage,
+        former_floor_stage,
+    ],
+    ("RENT", "after"): [
+        _fit_transform(RentPriceTransformer),
+        _fit_transform(RentSpaceTransformer),
+        _fit_transform(FloorTransformer),
+    ],
+}
+
+
+def make_listings_frame(n_rows, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame(
+        {
+            "CATEGORY_CODE": rng.choice(
+                ["APPT", "HOUSE", "PARK", "INDUS", "GASTRO"], n_rows
+            ).astype(object),
+            "CATEGORIES": rng.choice(
+                ["APARTMENT", "VILLA", "OPEN_SLOT", "DISPLAY_WINDOW", "HOTEL"],
+                n_rows,
+            ).astype(object),
+            "PRICE": rng.exponential(20000, n_rows),
+            "SPACE": rng.exponential(100, n_rows),
+            "FLOOR": np.floor(rng.exponential(10, n_rows)),
+        }
+    )
+
+
+def profile(name, variant, n_rows):
+    """
+    Runs the stages of a pipeline variant on a fresh frame and returns
+    the traced peak and retained memory and the process max RSS, in MB.
+    """
+    X = make_listings_frame(n_rows)
+    tracemalloc.start()
+    for stage in PIPELINES[name, variant]:
+        X = stage(X)
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return peak / 1e6, current / 1e6, max_rss
+
+
+def profile_in_fresh_process(name, variant, n_rows):
+    with ProcessPoolExecutor(
+        max_workers=1, mp_context=multiprocessing.get_context("spawn")
+    ) as executor:
+        return executor.submit(profile, name, variant, n_rows).result()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    print(
+        f"{'pipeline':<10}{'peak MB':>18}{'retained MB':>18}"
+        f"{'max RSS MB':>18}"
+    )
+    print(f"{'':<10}" + f"{'before':>10}{'after':>8}" * 3)
+    for name in sorted({name for name, _ in PIPELINES}):
+        before, after = (
+            profile_in_fresh_process(name, variant, args.rows)
+            for variant in ["before", "after"]
+        )
+        print(
+            f"{name:<10}"
+            + "".join(f"{b:>10.1f}{a:>8.1f}" for b, a in zip(before, after))
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Timing of RentSpaceTransformer.transform against the row count on a
+synthetic frame with many distinct CATEGORIES strings, next to the former
+category x CATEGORIES loop, which rewrote the SPACE column once per pair.
+
+Usage, with ds_toolkit installed:
+    python benchmarks/rent_space_scaling.py [--rows 10000 100000 1000000]
+"""
+
+import argparse
+import timeit
+
+import numpy as np
+import pandas as pd
+
+from ds_toolkit.lightfm import RentSpaceTransformer
+
+
+def make_listings_frame(n_rows, n_categories=300, seed=0):
+    rng = np.random.default_rng(seed)
+    categories = [
+        ",".join(rng.choice(list("ABCDEFGH"), 3)) for _ in range(n_categories)
+    ]
+    return pd.DataFrame(
+        {
+            "CATEGORY_CODE": rng.choice(
+                ["APPT", "HOUSE", "PARK", "INDUS", "GASTRO"], n_rows
+            ).astype(object),
+            "CATEGORIES": rng.choice(categories, n_rows).astype(object),
+            "SPACE": rng.uniform(0, 3, n_rows),
+        }
+    )
+
+
+def loop_transform(X):
+    for category in X["CATEGORY_CODE"].unique():
+        for sub_category in X["CATEGORIES"].unique():
+            if not (
+                category == "PARK"
+                or (category == "INDUS" and sub_category == "DISPLAY_WINDOW")
+            ):
+                X["SPACE"] = np.where(
+                    (X["CATEGORY_CODE"] == category)
+                    & (X["CATEGORIES"] == sub_category)
+                    & (X["SPACE"] <= 1),
+                    None,
+                    X["SPACE"],
+                )
+    return X
+
+
+def time_transform(transform, X, repeat):
+    return min(
+        timeit.repeat(lambda: transform(X.copy()), number=1, repeat=repeat)
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--rows", type=int, nargs="+", default=[10_000, 100_000, 1_000_000]
+    )
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument(
+        "--max-loop-rows",
+        type=int,
+        default=100_000,
+        help="largest row count timed with the former loop",
+    )
+    args = parser.parse_args()
+
+    print(f"{'rows':>10}{'loop s':>12}{'vectorized s':>15}")
+    for n_rows in args.rows:
+        X = make_listings_frame(n_rows)
+        loop = (
+            f"{time_transform(loop_transform, X, args.repeat):.3f}"
+            if n_rows <= args.max_loop_rows
+            else "-"
+        )
+        vectorized = time_transform(
+            RentSpaceTransformer().transform, X, args.repeat
+        )
+        print(f"{n_rows:>10}{loop:>12}{vectorized:>15.3f}")
+
+
+if __name__ == "__main__":
+    main()
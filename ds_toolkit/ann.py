@@ -0,0 +1,165 @@
+import time
+from typing import Optional
+
+import numpy as np
+from sklearn.cluster import MiniBatchKMeans
+
+from .recommendations_utils import SimilarityEngine
+
+__all__ = ["IVFIndex", "evaluate_recall_at_k"]
+
+
+class IVFIndex:
+    """
+    Approximate nearest neighbour index for cosine similarity between
+    item representations (e.g. LightFM item embeddings).
+    Normalised item vectors are clustered with k-means into n_lists inverted
+    lists and a query only scores the items of the n_probe lists with the
+    closest centroids. n_probe is the accuracy/latency knob: n_probe equal
+    to n_lists gives the exact result.
+
+    :param n_lists: number of inverted lists (k-means clusters).
+    :param n_probe: default number of lists scanned per query.
+    :param random_state: random state of the k-means clustering.
+    """
+
+    def __init__(
+        self,
+        n_lists: int = 256,
+        n_probe: int = 8,
+        random_state: Optional[int] = None,
+    ):
+        self.n_lists = n_lists
+        self.n_probe = n_probe
+        self.random_state = random_state
+
+    def build(self, item_representations):
+        """
+        Builds the index over the item representations.
+        Item vectors are stored grouped by list, so every list is
+        a contiguous block of the matrix.
+
+        :param item_representations: matrix of item representations.
+        :return: the index itself.
+        """
+        item_vectors = SimilarityEngine(item_representations).item_vectors
+        kmeans = MiniBatchKMeans(
+            n_clusters=min(self.n_lists, len(item_vectors)),
+            random_state=self.random_state,
+            n_init=3,
+        ).fit(item_vectors)
+        centroids = kmeans.cluster_centers_.astype(np.float32)
+        centroid_norms = np.linalg.norm(centroids, axis=1, keepdims=True)
+        centroid_norms[centroid_norms == 0] = 1
+        self.centroids = centroids / centroid_norms
+
+        order = np.argsort(kmeans.labels_, kind="stable")
+        counts = np.bincount(kmeans.labels_, minlength=len(centroids))
+        self.list_offsets = np.concatenate([[0], np.cumsum(counts)])
+        self.item_ids = order.astype(np.int64)
+        self.item_vectors = item_vectors[order]
+        return self
+
+    def query(self, source_vector, k: int, n_probe: Optional[int] = None):
+        """
+        Returns the approximately k most similar items in descending order.
+
+        :param source_vector: vector of features of a listing.
+        :param k: number of items to return.
+        :param n_probe: number of lists to scan, defaults to self.n_probe.
+        :return: tuple of arrays with item row indices and their scores.
+        """
+        n_probe = min(n_probe or self.n_probe, len(self.centroids))
+        source_vector = np.asarray(source_vector, dtype=np.float32).ravel()
+        source_vector = source_vector / np.linalg.norm(source_vector)
+
+        centroid_scores = self.centroids.dot(source_vector)
+        if n_probe < len(centroid_scores):
+            lists = np.argpartition(-centroid_scores, n_probe - 1)[:n_probe]
+        else:
+            lists = np.arange(len(centroid_scores))
+        positions = np.concatenate(
+            [
+                np.arange(self.list_offsets[i], self.list_offsets[i + 1])
+                for i in lists
+            ]
+        )
+        scores = self.item_vectors[positions].dot(source_vector)
+        if k < len(scores):
+            best = np.argpartition(-scores, k - 1)[:k]
+        else:
+            best = np.arange(len(scores))
+        best = best[np.argsort(-scores[best])]
+        return self.item_ids[positions[best]], scores[best]
+
+    def save(self, path: str):
+        """
+        Saves the index into a .npz file.
+
+        :param path: path of the file.
+        """
+        np.savez(
+            path,
+            centroids=self.centroids,
+            list_offsets=self.list_offsets,
+            item_ids=self.item_ids,
+            item_vectors=self.item_vectors,
+            params=np.array([self.n_lists, self.n_probe]),
+        )
+
+    @classmethod
+    def load(cls, path: str):
+        """
+        Loads an index saved with save.
+
+        :param path: path of the file.
+        :return: IVFIndex instance.
+        """
+        with np.load(path) as data:
+            n_lists, n_probe = data["params"].tolist()
+            index = cls(n_lists=n_lists, n_probe=n_probe)
+            index.centroids = data["centroids"]
+            index.list_offsets = data["list_offsets"]
+            index.item_ids = data["item_ids"]
+            index.item_vectors = data["item_vectors"]
+        return index
+
+
+def evaluate_recall_at_k(
+    index: IVFIndex,
+    item_representations,
+    queries,
+    k: int,
+    n_probe: Optional[int] = None,
+) -> dict:
+    """
+    Benchmarks the index against the exact brute-force similarity.
+
+    :param index: built IVFIndex.
+    :param item_representations: matrix of item representations
+        the index was built over.
+    :param queries: matrix of query vectors.
+    :param k: number of items to retrieve per query.
+    :param n_probe: number of lists to scan, defaults to index.n_probe.
+    :return: dictionary with the mean recall@k and mean query times in
+        seconds of the approximate and the exact search.
+    """
+    engine = SimilarityEngine(item_representations)
+    recalls = []
+    ann_time = exact_time = 0.0
+    for source_vector in queries:
+        start = time.perf_counter()
+        scores = engine.get_cosine_similarity(source_vector)
+        exact = np.argpartition(-scores, k - 1)[:k]
+        exact_time += time.perf_counter() - start
+
+        start = time.perf_counter()
+        approximate, _ = index.query(source_vector, k, n_probe=n_probe)
+        ann_time += time.perf_counter() - start
+
+        recalls.append(len(np.intersect1d(exact, approximate)) / k)
+    return {
+        "recall": float(np.mean(recalls)),
+        "ann_query_time": ann_time / len(queries),
+        "exact_query_time": exact_time / len(queries),
+    }
@@ -1,83 +1,155 @@
+from bisect import bisect_left
+
 import numpy as np
+import pandas as pd
+from scipy.sparse import csr_matrix
 from sklearn.base import BaseEstimator, TransformerMixin
 from sklearn.pipeline import make_pipeline
+from sklearn.utils.validation import check_is_fitted
 
-from .recommendations_utils import isnull
+from .recommendations_utils import isnull, isnull_array
 
 __all__ = [
     "features_to_tags_pipeline_buy",
     "features_to_tags_pipeline_rent",
     "features_to_list_with_tags_pipeline",
+    "features_to_item_features_pipeline",
+    "make_features_to_tags_pipeline_buy",
+    "make_features_to_tags_pipeline_rent",
+    "transform_listing_features",
+    "fit_in_chunks",
+    "transform_in_chunks",
 ]
 
 
+def _get_price_quantiles(X, quantile=0.99):
+    """
+    Returns a dictionary of categories and their price quantile,
+    computed in a single groupby over the CATEGORY_CODE column.
+    """
+    return (
+        X["PRICE"]
+        .astype(np.float64)
+        .groupby(X["CATEGORY_CODE"], observed=True)
+        .quantile(quantile)
+        .to_dict()
+    )
+
+
+def _get_missing_dtype(values):
+    """
+    Returns the dtype a column is cast to before values are set missing:
+    nullable Int64 for integer columns, so their tags keep the integer
+    format, and float64 for the others.
+    """
+    if pd.api.types.is_integer_dtype(values.dtype) or (
+        values.dtype == object
+        and pd.api.types.infer_dtype(values, skipna=True) == "integer"
+    ):
+        return "Int64"
+    return np.float64
+
+
+def _set_missing(X, column, mask):
+    """
+    Sets values of a column to nan where the mask is True. Integer columns
+    are kept (or made) nullable Int64, the others float64, and only
+    the masked values are written.
+    """
+    dtype = _get_missing_dtype(X[column])
+    if X[column].dtype != dtype:
+        X[column] = X[column].astype(dtype)
+    if mask.any():
+        X.loc[mask, column] = np.nan
+    return X
+
+
+def _drop_prices_above_cutoffs(X, price_cutoffs):
+    """
+    Sets price to nan where it is above the cutoff of its category.
+    Categories without a cutoff are left untouched. CATEGORY_CODE is mapped
+    as object, so a categorical column does not yield categorical cutoffs.
+    """
+    cutoffs = (
+        X["CATEGORY_CODE"].astype(object).map(price_cutoffs).astype(np.float64)
+    )
+    return _set_missing(X, "PRICE", X["PRICE"].astype(np.float64) > cutoffs)
+
+
+def _drop_record_price_above_cutoff(record, price_cutoffs):
+    """
+    Record counterpart of _drop_prices_above_cutoffs.
+    """
+    cutoff = price_cutoffs.get(record["CATEGORY_CODE"])
+    if (
+        cutoff is not None
+        and not isnull(record["PRICE"])
+        and record["PRICE"] > cutoff
+    ):
+        record["PRICE"] = None
+    return record
+
+
 class RentPriceTransformer(BaseEstimator, TransformerMixin):
     """
-    Sets price to None if it is above 99th quantile for almost all categories.
+    Sets price to nan if it is above 99th quantile for almost all categories.
     For APPT and HOUSE categories sets price to nan if it is above 30'000 and 60'000 respectively.
     Those prices are much higher than 99th quantile. It is done to avoid deleting too expensive listings from some expensive cantons and municipalities.
+    Quantiles are learned in fit, if the transformer is not fitted they are
+    computed on the transformed batch.
     """
 
+    fixed_price_cutoffs = {"APPT": 30000, "HOUSE": 60000}
+
     def __init__(self):
         pass
 
-    def fit(self, _X, _y=None):
+    def _get_price_cutoffs(self, X):
+        return {**_get_price_quantiles(X), **self.fixed_price_cutoffs}
+
+    def fit(self, X, _y=None):
+        self.price_cutoffs_ = self._get_price_cutoffs(X)
         return self
 
     def transform(self, X):
-        for category in X["CATEGORY_CODE"].unique():
-            if category == "APPT":
-                X["PRICE"] = np.where(
-                    (X["CATEGORY_CODE"] == category) & (X["PRICE"] > 30000),
-                    None,
-                    X["PRICE"],
-                )
-            elif category == "HOUSE":
-                X["PRICE"] = np.where(
-                    (X["CATEGORY_CODE"] == category) & (X["PRICE"] > 60000),
-                    None,
-                    X["PRICE"],
-                )
-            else:
-                quantile_99 = X.loc[X["CATEGORY_CODE"] == category][
-                    "PRICE"
-                ].quantile(0.99)
-                X["PRICE"] = np.where(
-                    (X["CATEGORY_CODE"] == category)
-                    & (X["PRICE"] > quantile_99),
-                    None,
-                    X["PRICE"],
-                )
-        return X
+        price_cutoffs = getattr(self, "price_cutoffs_", None)
+        if price_cutoffs is None:
+            price_cutoffs = self._get_price_cutoffs(X)
+        return _drop_prices_above_cutoffs(X, price_cutoffs)
+
+    def transform_record(self, record):
+        check_is_fitted(self, "price_cutoffs_")
+        return _drop_record_price_above_cutoff(record, self.price_cutoffs_)
 
 
 class BuyPriceTransformer(BaseEstimator, TransformerMixin):
     """
-    Sets price to None if it is above 99th quantile for every category.
+    Sets price to nan if it is above 99th quantile for every category.
+    Quantiles are learned in fit, if the transformer is not fitted they are
+    computed on the transformed batch.
     """
 
     def __init__(self):
         pass
 
     def fit(self, X, y=None):
+        self.price_cutoffs_ = _get_price_quantiles(X)
         return self
 
     def transform(self, X):
-        for category in X["CATEGORY_CODE"].unique():
-            quantile_99 = X.loc[X["CATEGORY_CODE"] == category][
-                "PRICE"
-            ].quantile(0.99)
-            X["PRICE"] = np.where(
-                (X["CATEGORY_CODE"] == category) & (X["PRICE"] > quantile_99),
-                None,
-                X["PRICE"],
-            )
-        return X
+        price_cutoffs = getattr(self, "price_cutoffs_", None)
+        if price_cutoffs is None:
+            price_cutoffs = _get_price_quantiles(X)
+        return _drop_prices_above_cutoffs(X, price_cutoffs)
+
+    def transform_record(self, record):
+        check_is_fitted(self, "price_cutoffs_")
+        return _drop_record_price_above_cutoff(record, self.price_cutoffs_)
 
 
 class RentSpaceTransformer(BaseEstimator, TransformerMixin):
     """
-    Sets space to None if it is suspiciously low (equals or lower than 1 sqm).
+    Sets space to nan if it is suspiciously low (equals or lower than 1 sqm).
     Only PARK and INDUS DISPLAY_WINDOW categories are allowed to have such space.
     """
 
@@ -88,26 +160,42 @@ class RentSpaceTransformer(BaseEstimator, TransformerMixin):
         return self
 
     def transform(self, X):
-        for category in X["CATEGORY_CODE"].unique():
-            for sub_category in X["CATEGORIES"].unique():
-                if category == "PARK" or (
-                    category == "INDUS" and sub_category == "DISPLAY_WINDOW"
-                ):
-                    X["SPACE"] = X["SPACE"]
-                else:
-                    X["SPACE"] = np.where(
-                        (X["CATEGORY_CODE"] == category)
-                        & (X["CATEGORIES"] == sub_category)
-                        & (X["SPACE"] <= 1),
-                        None,
-                        X["SPACE"],
-                    )
-        return X
+        exempt = (X["CATEGORY_CODE"] == "PARK") | (
+            (X["CATEGORY_CODE"] == "INDUS")
+            & (X["CATEGORIES"] == "DISPLAY_WINDOW")
+        )
+        return _set_missing(
+            X,
+            "SPACE",
+            X["CATEGORY_CODE"].notna()
+            & X["CATEGORIES"].notna()
+            & ~exempt
+            & (X["SPACE"] <= 1),
+        )
+
+    def transform_record(self, record):
+        category, space = record["CATEGORY_CODE"], record["SPACE"]
+        if (
+            not isnull(category)
+            and not isnull(record["CATEGORIES"])
+            and category != "PARK"
+            and not (
+                category == "INDUS"
+                and record["CATEGORIES"] == "DISPLAY_WINDOW"
+            )
+            and not isnull(space)
+            and space <= 1
+        ):
+            record["SPACE"] = None
+        return record
+
+    def __sklearn_is_fitted__(self):
+        return True
 
 
 class BuySpaceTransformer(BaseEstimator, TransformerMixin):
     """
-    Sets space to None for some categories if it is suspiciously high or low:
+    Sets space to nan for some categories if it is suspiciously high or low:
     - APPT space is not allowed to be > 1000 or <= 1
     - PARK space is not allowed to be > 100
     - GASTRO, HOUSE spaces are not allowed to be <= 1
@@ -120,34 +208,34 @@ class BuySpaceTransformer(BaseEstimator, TransformerMixin):
         return self
 
     def transform(self, X):
-        for category in X["CATEGORY_CODE"].unique():
-            if category == "APPT":
-                X["SPACE"] = np.where(
-                    ((X["CATEGORY_CODE"] == category) & (X["SPACE"] > 1000))
-                    | ((X["CATEGORY_CODE"] == category) & (X["SPACE"] <= 1)),
-                    None,
-                    X["SPACE"],
-                )
-            elif category == "PARK":
-                X["SPACE"] = np.where(
-                    (X["CATEGORY_CODE"] == category) & (X["SPACE"] > 100),
-                    None,
-                    X["SPACE"],
-                )
-            elif category in ["GASTRO", "HOUSE"]:
-                X["SPACE"] = np.where(
-                    (X["CATEGORY_CODE"] == category) & (X["SPACE"] <= 1),
-                    None,
-                    X["SPACE"],
-                )
-            else:
-                continue
-        return X
+        category, space = X["CATEGORY_CODE"], X["SPACE"]
+        return _set_missing(
+            X,
+            "SPACE",
+            ((category == "APPT") & ((space > 1000) | (space <= 1)))
+            | ((category == "PARK") & (space > 100))
+            | (category.isin(["GASTRO", "HOUSE"]) & (space <= 1)),
+        )
+
+    def transform_record(self, record):
+        category, space = record["CATEGORY_CODE"], record["SPACE"]
+        if isnull(space):
+            return record
+        if (
+            (category == "APPT" and (space > 1000 or space <= 1))
+            or (category == "PARK" and space > 100)
+            or (category in ["GASTRO", "HOUSE"] and space <= 1)
+        ):
+            record["SPACE"] = None
+        return record
+
+    def __sklearn_is_fitted__(self):
+        return True
 
 
 class FloorTransformer(BaseEstimator, TransformerMixin):
     """
-    Sets floor to None if it is suspiciously high.
+    Sets floor to nan if it is suspiciously high.
     The highest building in Switzerland has 50 floors.
     """
 
@@ -158,83 +246,175 @@ class FloorTransformer(BaseEstimator, TransformerMixin):
         return self
 
     def transform(self, X):
-        X["FLOOR"] = np.where(X["FLOOR"] >= 50, None, X["FLOOR"])
-        return X
+        return _set_missing(X, "FLOOR", X["FLOOR"] >= 50)
+
+    def transform_record(self, record):
+        if not isnull(record["FLOOR"]) and record["FLOOR"] >= 50:
+            record["FLOOR"] = None
+        return record
+
+    def __sklearn_is_fitted__(self):
+        return True
 
 
 class YearTransformer(BaseEstimator, TransformerMixin):
     """
     Splits built year if it's available into 7 bins:
     ancient, 1901-1920, 1921-1940, 1941-1960, 1961-1980, 1981-2000, modern
+    in a single pass with pd.cut. YEAR is a pandas Categorical.
+    Bins are right-closed intervals between consecutive edges and can be
+    changed with the bins and labels parameters.
     """
 
-    def __init__(self):
-        pass
+    default_bins = (-np.inf, 1900, 1920, 1940, 1960, 1980, 2000, np.inf)
+    default_labels = (
+        "ancient",
+        "1901-1920",
+        "1921-1940",
+        "1941-1960",
+        "1961-1980",
+        "1981-2000",
+        "modern",
+    )
+
+    def __init__(self, bins=None, labels=None):
+        self.bins = bins
+        self.labels = labels
+
+    def _get_bins(self):
+        if self.bins is None:
+            return self.default_bins, self.labels or self.default_labels
+        if self.labels is None:
+            raise ValueError("labels are required with custom bins")
+        return self.bins, self.labels
 
     def fit(self, X, y=None):
         return self
 
     def transform(self, X):
-        X["YEAR"] = np.where(
-            X["YEARBUILT"] <= 1900,
-            "ancient",
-            np.where(
-                X["YEARBUILT"] <= 1920,
-                "1901-1920",
-                np.where(
-                    X["YEARBUILT"] <= 1940,
-                    "1921-1940",
-                    np.where(
-                        X["YEARBUILT"] <= 1960,
-                        "1941-1960",
-                        np.where(
-                            X["YEARBUILT"] <= 1980,
-                            "1961-1980",
-                            np.where(
-                                X["YEARBUILT"] <= 2000,
-                                "1981-2000",
-                                np.where(
-                                    X["YEARBUILT"] > 2000, "modern", None
-                                ),
-                            ),
-                        ),
-                    ),
-                ),
-            ),
+        bins, labels = self._get_bins()
+        X["YEAR"] = pd.cut(
+            X["YEARBUILT"].astype(np.float64),
+            bins=bins,
+            labels=labels,
+            include_lowest=True,
         )
-        X.drop(columns=["YEARBUILT"], inplace=True)
+        del X["YEARBUILT"]
         return X
 
+    def transform_record(self, record):
+        bins, labels = self._get_bins()
+        year_built = record.pop("YEARBUILT")
+        record["YEAR"] = None
+        if not isnull(year_built):
+            position = bisect_left(bins, year_built)
+            if position == 0 and year_built == bins[0]:
+                position = 1
+            if 0 < position < len(bins):
+                record["YEAR"] = labels[position - 1]
+        return record
+
+    def __sklearn_is_fitted__(self):
+        return True
+
+
+def _isnull_column(values):
+    """
+    Vectorized isnull of a DataFrame column: None and nan values are null.
+    """
+    if values.dtype == object:
+        return isnull_array(values.to_numpy())
+    return values.isna().to_numpy()
+
+
+def _factorize_column(values):
+    """
+    pd.factorize of a DataFrame column. Values of object columns are
+    distinguished by type too, since equal values of different types,
+    e.g. 1, 1.0 and True, format into different tags.
+    """
+    codes, uniques = pd.factorize(values)
+    if values.dtype != object or len(uniques) == 0:
+        return codes, uniques
+    type_codes, types = pd.factorize(
+        np.frompyfunc(type, 1, 1)(values.to_numpy())
+    )
+    if len(types) == 1:
+        return codes, uniques
+    _, first_rows, codes = np.unique(
+        codes.astype(np.int64) * len(types) + type_codes,
+        return_index=True,
+        return_inverse=True,
+    )
+    return codes.ravel(), values.to_numpy()[first_rows]
+
 
 class FeaturesIntoTagsTransformer(BaseEstimator, TransformerMixin):
     """
     Transforms every feature of every listing from pandas DataFrame
     into a list of tags - tuples (listing_id, features_list).
     These tags are needed for the LightFM model and should be in the string format.
+    Tags are built column by column, formatting every distinct value once,
+    and assembled into per-listing lists in one pass.
+    If a vocabulary (dictionary of tags and their integer ids) is given,
+    integer tag ids are emitted instead of strings and unknown tags are skipped.
     """
 
-    def __init__(self):
-        pass
+    def __init__(self, vocabulary=None):
+        self.vocabulary = vocabulary
 
     def fit(self, X, y=None):
         return self
 
     def transform(self, X):
-        results = X.to_dict(orient="records")
-        listings_features = []
-        for item in results:
-            features_list = []
-            listing_id = None
-            for k, v in item.items():
-                if k == "LISTING_ID":
-                    listing_id = v
-                elif isnull(v):
-                    continue
-                else:
-                    features_list.append(f"{k}:{v}")
-            row = (listing_id, features_list)
-            listings_features.append(row)
-        return listings_features
+        if "LISTING_ID" in X.columns:
+            listing_ids = X["LISTING_ID"].tolist()
+        else:
+            listing_ids = [None] * len(X)
+        columns = [column for column in X.columns if column != "LISTING_ID"]
+        tags = np.empty((len(X), len(columns)), dtype=object)
+        valid = np.zeros((len(X), len(columns)), dtype=bool)
+        for j, column in enumerate(columns):
+            values = X[column]
+            (rows,) = np.where(~_isnull_column(values))
+            # Tags are formatted once per distinct value of the column
+            codes, uniques = _factorize_column(values.iloc[rows])
+            unique_tags = [f"{column}:{value}" for value in uniques]
+            if self.vocabulary is not None:
+                unique_tags = [self.vocabulary.get(tag) for tag in unique_tags]
+                known = np.array([tag is not None for tag in unique_tags])
+                if len(known):
+                    rows, codes = rows[known[codes]], codes[known[codes]]
+            column_tags = np.empty(len(unique_tags), dtype=object)
+            column_tags[:] = unique_tags
+            tags[rows, j] = column_tags[codes]
+            valid[rows, j] = True
+
+        flat_tags = tags[valid].tolist()
+        offsets = np.concatenate([[0], np.cumsum(valid.sum(axis=1))]).tolist()
+        return [
+            (listing_id, flat_tags[start:end])
+            for listing_id, start, end in zip(
+                listing_ids, offsets[:-1], offsets[1:]
+            )
+        ]
+
+    def transform_record(self, record):
+        features_list = [
+            f"{k}:{v}"
+            for k, v in record.items()
+            if k != "LISTING_ID" and not isnull(v)
+        ]
+        if self.vocabulary is not None:
+            features_list = [
+                self.vocabulary[tag]
+                for tag in features_list
+                if tag in self.vocabulary
+            ]
+        return record["LISTING_ID"], features_list
+
+    def __sklearn_is_fitted__(self):
+        return True
 
 
 class TagsListTransformer(BaseEstimator, TransformerMixin):
@@ -258,14 +438,204 @@ class TagsListTransformer(BaseEstimator, TransformerMixin):
         feature_set = list(set(feature_set))
         return feature_set
 
+    def __sklearn_is_fitted__(self):
+        return True
+
+
+class TagsVocabularyTransformer(BaseEstimator, TransformerMixin):
+    """
+    Assigns stable integer ids to all listing features from
+    FeaturesIntoTagsTransformer and transforms them into a sparse
+    item features matrix for the LightFM model: one row per listing
+    in the input order, one column per tag id up to the largest one.
+    Tags are numbered in sorted order in fit, unless a vocabulary
+    (dictionary of tags and their integer ids) is given.
+    partial_fit extends the vocabulary incrementally with new listings.
+    The fitted vocabulary_ can be persisted with dump_object_to_s3.
+    """
+
+    def __init__(self, vocabulary=None):
+        self.vocabulary = vocabulary
+
+    def fit(self, X, y=None):
+        if self.vocabulary is not None:
+            self.vocabulary_ = dict(self.vocabulary)
+            return self
+        feature_set = set()
+        for _, features_list in X:
+            feature_set.update(features_list)
+        self.vocabulary_ = {
+            tag: tag_id for tag_id, tag in enumerate(sorted(feature_set))
+        }
+        return self
+
+    def partial_fit(self, X, y=None):
+        """
+        Updates the vocabulary with a delta batch of listings: tags not seen
+        before get ids following the largest id of the vocabulary, in sorted
+        order, and ids of known tags never change. The new tags are stored in new_tags_.
+        """
+        if not hasattr(self, "vocabulary_"):
+            self.vocabulary_ = dict(self.vocabulary or {})
+        new_tags = set()
+        for _, features_list in X:
+            new_tags.update(
+                tag for tag in features_list if tag not in self.vocabulary_
+            )
+        self.new_tags_ = sorted(new_tags)
+        next_id = max(self.vocabulary_.values(), default=-1) + 1
+        for tag_id, tag in enumerate(self.new_tags_, next_id):
+            self.vocabulary_[tag] = tag_id
+        return self
+
+    def transform(self, X):
+        check_is_fitted(self, "vocabulary_")
+        indptr = [0]
+        indices = []
+        for _, features_list in X:
+            indices.extend(
+                self.vocabulary_[tag]
+                for tag in features_list
+                if tag in self.vocabulary_
+            )
+            indptr.append(len(indices))
+        return csr_matrix(
+            (
+                np.ones(len(indices), dtype=np.float32),
+                np.array(indices, dtype=np.int32),
+                np.array(indptr, dtype=np.int64),
+            ),
+            shape=(
+                len(indptr) - 1,
+                max(self.vocabulary_.values(), default=-1) + 1,
+            ),
+        )
+
 
-features_to_tags_pipeline_buy = make_pipeline(
-    BuyPriceTransformer(),
-    BuySpaceTransformer(),
-    FloorTransformer(),
-    YearTransformer(),
-    FeaturesIntoTagsTransformer(),
-)
+def make_features_to_tags_pipeline_buy():
+    """
+    Builds transofrmation pipeline for BUY listings:
+    - clean some data (see Transformers' docstrings)
+    - transform features into tags
+    """
+    return make_pipeline(
+        BuyPriceTransformer(),
+        BuySpaceTransformer(),
+        FloorTransformer(),
+        YearTransformer(),
+        FeaturesIntoTagsTransformer(),
+    )
+
+
+def make_features_to_tags_pipeline_rent():
+    """
+    Builds transofrmation pipeline for RENT listings:
+    - clean some data (see Transformers' docstrings)
+    - transform features into tags
+    """
+    return make_pipeline(
+        RentPriceTransformer(),
+        RentSpaceTransformer(),
+        FloorTransformer(),
+        YearTransformer(),
+        FeaturesIntoTagsTransformer(),
+    )
+
+
+def transform_listing_features(pipeline, listing_features):
+    """
+    Transforms the features of a single listing (see get_listing_features)
+    into tags with a fitted features_to_tags pipeline, without building
+    a DataFrame. Every step applies its rules to the listing dictionary and
+    looks the thresholds learned in fit up, so the work per listing does not
+    depend on the size of the training data.
+
+    :param pipeline: fitted features_to_tags pipeline.
+    :param listing_features: dictionary of listing features.
+    :return: tuple (listing_id, features_list).
+    """
+    record = dict(listing_features)
+    for _, step in pipeline.steps:
+        record = step.transform_record(record)
+    return record
+
+
+def _get_price_transformer(pipeline):
+    """
+    Returns the price transformer step of a features_to_tags pipeline.
+    """
+    for _, step in pipeline.steps:
+        if isinstance(step, (BuyPriceTransformer, RentPriceTransformer)):
+            return step
+    raise ValueError("The pipeline has no price transformer step")
+
+
+def fit_in_chunks(pipeline, chunks):
+    """
+    Fits a features_to_tags pipeline on DataFrame chunks, e.g. from
+    pd.read_csv(..., chunksize=...). Only the price transformer learns
+    statistics from the data, so only the non-null prices of every chunk
+    are kept, as float64 arrays grouped by CATEGORY_CODE. The fit memory
+    still grows linearly with the number of listings, by about 9 bytes
+    per listing (a float64 price and a categorical code, which pandas
+    keeps in the smallest integer dtype for the number of categories),
+    while the chunks themselves are released as soon as they are read.
+
+    :param pipeline: features_to_tags pipeline.
+    :param chunks: iterable of DataFrames.
+    :return: the fitted pipeline.
+    """
+    price_transformer = _get_price_transformer(pipeline)
+    prices = {}
+    for chunk in chunks:
+        chunk_prices = chunk["PRICE"].astype(np.float64)
+        valid = chunk_prices.notna() & chunk["CATEGORY_CODE"].notna()
+        for category, values in chunk_prices[valid].groupby(
+            chunk["CATEGORY_CODE"][valid], observed=True
+        ):
+            prices.setdefault(category, []).append(values.to_numpy())
+
+    categories = list(prices)
+    prices = [np.concatenate(prices.pop(category)) for category in categories]
+    price_transformer.fit(
+        pd.DataFrame(
+            {
+                "CATEGORY_CODE": pd.Categorical.from_codes(
+                    np.repeat(
+                        np.arange(len(categories), dtype=np.intp),
+                        [len(values) for values in prices],
+                    ),
+                    categories=categories,
+                ),
+                "PRICE": np.concatenate(prices) if prices else [],
+            }
+        )
+    )
+    return pipeline
+
+
+def transform_in_chunks(pipeline, chunks):
+    """
+    Lazily transforms DataFrame chunks with a fitted features_to_tags
+    pipeline, so the peak memory depends on the chunk size only.
+    The pipeline must be fitted, so every chunk is cleaned with the same
+    global statistics instead of ones computed per chunk.
+
+    :param pipeline: fitted features_to_tags pipeline.
+    :param chunks: iterable of DataFrames.
+    :return: generator of tuples (listing_id, features_list).
+    """
+    for _, step in pipeline.steps:
+        check_is_fitted(step)
+
+    def _transform():
+        for chunk in chunks:
+            yield from pipeline.transform(chunk)
+
+    return _transform()
+
+
+features_to_tags_pipeline_buy = make_features_to_tags_pipeline_buy()
 """
 # Build transofrmation pipeline for BUY listings:
 # - clean some data (see Transformers' docstrings)
@@ -274,13 +644,7 @@ features_to_tags_pipeline_buy = make_pipeline(
 """
 
 
-features_to_tags_pipeline_rent = make_pipeline(
-    RentPriceTransformer(),
-    RentSpaceTransformer(),
-    FloorTransformer(),
-    YearTransformer(),
-    FeaturesIntoTagsTransformer(),
-)
+features_to_tags_pipeline_rent = make_features_to_tags_pipeline_rent()
 """
 # Build transofrmation pipeline for RENT listings:
 # - clean some data (see Transformers' docstrings)
@@ -289,3 +653,9 @@ features_to_tags_pipeline_rent = make_pipeline(
 """
 
 features_to_list_with_tags_pipeline = make_pipeline(TagsListTransformer())
+
+features_to_item_features_pipeline = make_pipeline(TagsVocabularyTransformer())
+"""
+# Build item features pipeline: assign integer ids to the feature tags
+# and create the sparse item features matrix for the LightFM model
+"""
@@ -0,0 +1,178 @@
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
+import numpy as np
+
+from .recommendations_utils import (
+    SimilarityEngine,
+    build_category_index,
+    encode_categories,
+    get_acceptable_recommendations_mask,
+)
+
+__all__ = ["build_model_id_to_ids"]
+
+_worker_state = {}
+
+
+def _init_worker(item_vectors_path, listings_arrays, options):
+    """
+    Initializes a worker process: memory-maps the normalised item vectors
+    and keeps the listings arrays and options for the chunks to come.
+    """
+    _worker_state["engine"] = SimilarityEngine.from_normalised(
+        np.load(item_vectors_path, mmap_mode="r")
+    )
+    _worker_state["listings"] = listings_arrays
+    _worker_state["options"] = options
+
+
+def _build_chunk(bounds):
+    """
+    Builds the recommendations of the listings in rows [start, end).
+
+    :param bounds: tuple of start and end row indices.
+    :return: list of tuples (listing_id, [(listing_id, distance), ...]).
+    """
+    start, end = bounds
+    engine = _worker_state["engine"]
+    listings = _worker_state["listings"]
+    options = _worker_state["options"]
+
+    top_idx, top_scores = engine.get_top_k_batch(
+        engine.item_vectors[start:end],
+        k=options["n_candidates"],
+        threshold=options["threshold"],
+        block_size=options["block_size"],
+    )
+    results = []
+    for row, (idx, scores) in enumerate(zip(top_idx, top_scores), start):
+        valid = idx >= 0
+        idx, scores = idx[valid], scores[valid]
+        source_listing = {
+            "LATITUDE": listings["latitudes"][row],
+            "LONGITUDE": listings["longitudes"][row],
+            "CATEGORIES": listings["categories"][row],
+        }
+        accepted = get_acceptable_recommendations_mask(
+            source_listing,
+            options["max_geo_distance"],
+            listings["latitudes"][idx],
+            listings["longitudes"][idx],
+            listings["is_active"][idx],
+            listings["category_bitmasks"][idx],
+            listings["category_index"],
+        )
+        idx = idx[accepted][: options["k"]]
+        scores = scores[accepted][: options["k"]]
+        results.append(
+            (
+                listings["listing_ids"][row].item(),
+                list(
+                    zip(
+                        listings["listing_ids"][idx].tolist(),
+                        (1 - scores).tolist(),
+                    )
+                ),
+            )
+        )
+    return results
+
+
+def build_model_id_to_ids(
+    item_representations,
+    listings: list,
+    max_geo_distance: float,
+    k: int = 200,
+    n_candidates: int = 500,
+    threshold: float = 0.8,
+    n_workers: Optional[int] = None,
+    chunk_size: int = 4096,
+    block_size: int = 1024,
+    tmp_dir: Optional[str] = None,
+) -> dict:
+    """
+    Builds the mapping of listing ids and their recommendations consumed by
+    get_recommendations_ordered_by_distance for the whole catalogue.
+    Listings are split into chunks of rows processed by a pool of worker
+    processes. The normalised item vectors are written once into a .npy
+    file which every worker memory-maps, so they are not pickled to the
+    workers.
+
+    For every listing the n_candidates most similar items above the
+    threshold are filtered with the same rules as is_acceptable_recommendation
+    and the k best remaining ones are kept, ordered by cosine distance.
+
+    :param item_representations: matrix of item representations.
+    :param listings: list of listing dictionaries aligned with the rows of
+        the matrix, with LISTING_ID, LATITUDE, LONGITUDE, CATEGORIES
+        and IS_ACTIVE keys.
+    :param max_geo_distance: maximum distance in km between the source and target listings.
+    :param k: maximum number of recommendations per listing.
+    :param n_candidates: number of most similar items to filter per listing.
+    :param threshold: similarity score threshold.
+    :param n_workers: number of worker processes, defaults to the CPU count.
+        With 1 the listings are processed in the current process.
+    :param chunk_size: number of listings per task sent to a worker.
+    :param block_size: number of listings per similarity matrix product.
+    :param tmp_dir: directory for the memory-mapped item vectors file.
+    :return: dictionary of listing ids and their recommendations as lists
+        of tuples (listing_id, distance).
+    """
+    categories = [listing["CATEGORIES"] for listing in listings]
+    category_index = build_category_index(categories)
+    listings_arrays = {
+        "listing_ids": np.array(
+            [listing["LISTING_ID"] for listing in listings], dtype=np.int64
+        ),
+        "latitudes": np.array(
+            [listing["LATITUDE"] for listing in listings], dtype=np.float64
+        ),
+        "longitudes": np.array(
+            [listing["LONGITUDE"] for listing in listings], dtype=np.float64
+        ),
+        "is_active": np.array(
+            [bool(listing["IS_ACTIVE"]) for listing in listings], dtype=bool
+        ),
+        "categories": categories,
+        "category_bitmasks": encode_categories(categories, category_index),
+        "category_index": category_index,
+    }
+    options = {
+        "max_geo_distance": max_geo_distance,
+        "k": k,
+        "n_candidates": n_candidates,
+        "threshold": threshold,
+        "block_size": block_size,
+    }
+    chunks = [
+        (start, min(start + chunk_size, len(listings)))
+        for start in range(0, len(listings), chunk_size)
+    ]
+    item_vectors = SimilarityEngine(item_representations).item_vectors
+
+    model_id_to_ids = {}
+    with tempfile.TemporaryDirectory(dir=tmp_dir) as directory:
+        item_vectors_path = os.path.join(directory, "item_vectors.npy")
+        np.save(item_vectors_path, item_vectors)
+        del item_vectors
+        initargs = (item_vectors_path, listings_arrays, options)
+
+        if n_workers == 1:
+            _init_worker(*initargs)
+            try:
+                for chunk in chunks:
+                    model_id_to_ids.update(_build_chunk(chunk))
+            finally:
+                _worker_state.clear()
+        else:
+            with ProcessPoolExecutor(
+                max_workers=n_workers,
+                initializer=_init_worker,
+                initargs=initargs,
+            ) as executor:
+                for results in executor.map(_build_chunk, chunks):
+                    model_id_to_ids.update(results)
+    return model_id_to_ids
@@ -1,8 +1,20 @@
+import heapq
+import os
 import pickle
-from typing import Any, Optional
+from functools import lru_cache
+from operator import itemgetter
+from typing import Any, Iterable, Optional
 
 import numpy as np
 from geopy.distance import distance
+from sklearn.neighbors import BallTree
+
+EARTH_RADIUS_KM = 6371.0088
+# Upper bound of the relative difference between the spherical (haversine)
+# and the ellipsoidal (geodesic) distance, with some safety margin.
+GEODESIC_TOLERANCE = 0.01
+
+_MISSING = object()
 
 
 def is_acceptable_recommendation(
@@ -33,6 +45,171 @@ def is_acceptable_recommendation(
     )
 
 
+def build_category_index(categories: Iterable[str]) -> dict:
+    """
+    Builds a mapping from every category found in the comma-joined
+    CATEGORIES strings to its bit position in a category bitmask.
+
+    :param categories: iterable of comma-joined CATEGORIES strings.
+    :return: dictionary of category and its bit position.
+    """
+    category_index = {}
+    for listing_categories in categories:
+        for category in listing_categories.split(","):
+            if category not in category_index:
+                category_index[category] = len(category_index)
+    return category_index
+
+
+def encode_categories(
+    categories: Iterable[str], category_index: dict
+) -> np.ndarray:
+    """
+    Encodes comma-joined CATEGORIES strings into category bitmasks.
+    Categories missing from the index are ignored.
+
+    :param categories: iterable of comma-joined CATEGORIES strings.
+    :param category_index: dictionary of category and its bit position,
+        see build_category_index.
+    :return: uint64 matrix of shape (n_listings, n_words) with the bitmasks.
+    """
+    n_words = max(1, (len(category_index) + 63) // 64)
+    rows = []
+    for listing_categories in categories:
+        row = [0] * n_words
+        for category in listing_categories.split(","):
+            bit = category_index.get(category)
+            if bit is not None:
+                row[bit // 64] |= 1 << (bit % 64)
+        rows.append(row)
+    return np.array(rows, dtype=np.uint64).reshape(-1, n_words)
+
+
+def get_haversine_distance(latitude, longitude, latitudes, longitudes):
+    """
+    Function calculates great-circle distances in km between a point
+    and arrays of points.
+
+    :param latitude: latitude of the point.
+    :param longitude: longitude of the point.
+    :param latitudes: array of latitudes.
+    :param longitudes: array of longitudes.
+    :return: array of distances in km.
+    """
+    lat1 = np.radians(latitude)
+    lat2 = np.radians(np.asarray(latitudes, dtype=np.float64))
+    dlat = lat2 - lat1
+    dlon = np.radians(np.asarray(longitudes, dtype=np.float64) - longitude)
+    a = (
+        np.sin(dlat / 2) ** 2
+        + np.cos(lat1) * np.cos(lat2) * np.sin(dlon / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def get_acceptable_recommendations_mask(
+    source_listing: dict,
+    max_geo_distance: float,
+    latitudes: np.ndarray,
+    longitudes: np.ndarray,
+    is_active: np.ndarray,
+    categories: np.ndarray,
+    category_index: dict,
+) -> np.ndarray:
+    """
+    Vectorized counterpart of is_acceptable_recommendation which checks
+    many target listings at once.
+    Distances are calculated with the haversine formula and only targets
+    close to max_geo_distance are rechecked with the geodesic distance,
+    so the decisions are the same as the ones of the scalar function.
+    Targets with missing coordinates are never acceptable.
+
+    :param source_listing: listing the recommendation is needed for.
+    :param max_geo_distance: maximum distance in km between the source and target listings.
+    :param latitudes: array of target listings latitudes.
+    :param longitudes: array of target listings longitudes.
+    :param is_active: array of target listings IS_ACTIVE flags.
+    :param categories: target listings category bitmasks, see encode_categories.
+    :param category_index: category index the bitmasks were encoded with.
+    :return: boolean array, True for acceptable target listings.
+    """
+    source_categories = encode_categories(
+        [source_listing["CATEGORIES"]], category_index
+    )
+    mask = np.asarray(is_active, dtype=bool) & np.any(
+        categories & source_categories, axis=1
+    )
+    latitudes = np.asarray(latitudes, dtype=np.float64)
+    longitudes = np.asarray(longitudes, dtype=np.float64)
+    source_point = (source_listing["LATITUDE"], source_listing["LONGITUDE"])
+    geo_dist = get_haversine_distance(*source_point, latitudes, longitudes)
+
+    accepted = mask & (geo_dist <= max_geo_distance * (1 - GEODESIC_TOLERANCE))
+    (uncertain,) = np.where(
+        mask
+        & ~accepted
+        & (geo_dist <= max_geo_distance * (1 + GEODESIC_TOLERANCE))
+    )
+    for idx in uncertain:
+        accepted[idx] = (
+            distance(source_point, (latitudes[idx], longitudes[idx])).km
+            <= max_geo_distance
+        )
+    return accepted
+
+
+class GeoIndex:
+    """
+    Spatial index over listings built once from the listing features
+    (see get_listing_features) to retrieve listings within a radius
+    without scanning the whole catalogue.
+    Listings without coordinates are not indexed; if none has coordinates,
+    no tree is built and the queries return no listings.
+
+    :param listings_features: list of listing features dictionaries,
+        the position in the list is the row index returned by the queries.
+    """
+
+    def __init__(self, listings_features: list):
+        coordinates = np.array(
+            [
+                (
+                    convert_to_float(features["LATITUDE"]),
+                    convert_to_float(features["LONGITUDE"]),
+                )
+                for features in listings_features
+            ],
+            dtype=np.float64,
+        ).reshape(-1, 2)
+        (self.row_indices,) = np.where(~np.isnan(coordinates).any(axis=1))
+        self.tree = None
+        if len(self.row_indices):
+            self.tree = BallTree(
+                np.radians(coordinates[self.row_indices]), metric="haversine"
+            )
+
+    def query_radius(
+        self, latitude: float, longitude: float, radius: float
+    ) -> np.ndarray:
+        """
+        Returns row indices of all listings within the radius of a point.
+        The radius is extended by the geodesic tolerance so no listing
+        accepted by is_acceptable_recommendation is missed.
+
+        :param latitude: latitude of the point.
+        :param longitude: longitude of the point.
+        :param radius: radius in km.
+        :return: sorted array of listing row indices.
+        """
+        if self.tree is None:
+            return np.array([], dtype=np.intp)
+        (idx,) = self.tree.query_radius(
+            np.radians([[latitude, longitude]]),
+            r=radius * (1 + GEODESIC_TOLERANCE) / EARTH_RADIUS_KM,
+        )
+        return np.sort(self.row_indices[idx])
+
+
 def get_cosine_similarity(source_vector, item_representations):
     """
     Function calculates cosine similarity between a source vector
@@ -62,6 +239,130 @@ def filter_scores_below_treshold(scores, threshold=0.8):
     return idx[np.argsort(-scores[idx])][1:]
 
 
+class SimilarityEngine:
+    """
+    Cosine similarity engine over the item representations.
+    Item vectors are normalised once at construction and kept in the given
+    dtype, so a query is a single matrix-vector product followed by a
+    partial sort of the k best items.
+
+    :param item_representations: matrix of item representations.
+    :param dtype: dtype of the normalised item vectors.
+    """
+
+    def __init__(self, item_representations, dtype=np.float32):
+        item_vectors = np.array(item_representations, dtype=dtype)
+        item_norms = np.linalg.norm(item_vectors, axis=1, keepdims=True)
+        item_norms[item_norms == 0] = 1
+        item_vectors /= item_norms
+        self.item_vectors = item_vectors
+
+    @classmethod
+    def from_normalised(cls, item_vectors):
+        """
+        Creates an engine over already normalised item vectors without
+        copying them, e.g. a shared memory or memory-mapped matrix.
+
+        :param item_vectors: matrix of normalised item vectors.
+        :return: SimilarityEngine instance.
+        """
+        engine = cls.__new__(cls)
+        engine.item_vectors = item_vectors
+        return engine
+
+    def get_cosine_similarity(self, source_vector, candidates=None):
+        """
+        Calculates cosine similarity between a source vector and the items.
+
+        :param source_vector: vector of features of a listing.
+        :param candidates: optional array of item row indices to score,
+            e.g. the result of GeoIndex.query_radius.
+        :return: vector of similarity scores with the (candidate) items.
+        """
+        source_vector = np.asarray(
+            source_vector, dtype=self.item_vectors.dtype
+        ).ravel()
+        source_vector = source_vector / np.linalg.norm(source_vector)
+        if candidates is None:
+            return self.item_vectors.dot(source_vector)
+        return self.item_vectors[candidates].dot(source_vector)
+
+    def get_top_k(self, source_vector, k, threshold=0.8, candidates=None):
+        """
+        Returns the k most similar items with the similarity score above
+        the threshold in descending order. Like filter_scores_below_treshold
+        the most similar item is dropped as it is the source listing itself.
+
+        :param source_vector: vector of features of a listing.
+        :param k: number of items to return.
+        :param threshold: similarity score threshold.
+        :param candidates: optional array of item row indices to score.
+        :return: tuple of arrays with item row indices and their scores.
+        """
+        scores = self.get_cosine_similarity(source_vector, candidates)
+        n_best = k + 1
+        if n_best < len(scores):
+            idx = np.argpartition(-scores, n_best - 1)[:n_best]
+        else:
+            idx = np.arange(len(scores))
+        idx = idx[scores[idx] > threshold]
+        idx = idx[np.argsort(-scores[idx])][1:]
+        if candidates is None:
+            return idx, scores[idx]
+        return np.asarray(candidates)[idx], scores[idx]
+
+    def get_top_k_batch(
+        self, source_vectors, k, threshold=0.8, block_size=1024
+    ):
+        """
+        Batch counterpart of get_top_k. Similarities are computed as
+        matrix-matrix products of at most block_size source vectors at once,
+        which caps the peak memory to block_size x n_items scores.
+
+        :param source_vectors: matrix of source vectors,
+            None to use all the items as source vectors.
+        :param k: number of items to return per source vector.
+        :param threshold: similarity score threshold.
+        :param block_size: number of source vectors per block.
+        :return: tuple of (n_sources, k) arrays with item row indices and
+            their scores in descending order, padded with -1 and nan.
+        """
+        if source_vectors is None:
+            source_vectors = self.item_vectors
+        else:
+            source_vectors = np.asarray(
+                source_vectors, dtype=self.item_vectors.dtype
+            )
+            source_vectors = source_vectors / np.linalg.norm(
+                source_vectors, axis=1, keepdims=True
+            )
+        n_sources, n_items = len(source_vectors), len(self.item_vectors)
+        n_best = min(k + 1, n_items)
+        top_idx = np.full((n_sources, k), -1, dtype=np.int64)
+        top_scores = np.full(
+            (n_sources, k), np.nan, dtype=self.item_vectors.dtype
+        )
+        for start in range(0, n_sources, block_size):
+            end = min(start + block_size, n_sources)
+            scores = source_vectors[start:end].dot(self.item_vectors.T)
+            if n_best < n_items:
+                idx = np.argpartition(-scores, n_best - 1, axis=1)[:, :n_best]
+            else:
+                idx = np.broadcast_to(np.arange(n_items), scores.shape)
+            best_scores = np.take_along_axis(scores, idx, axis=1)
+            best_scores[~(best_scores > threshold)] = -np.inf
+            order = np.argsort(-best_scores, axis=1)[:, 1:]
+            idx = np.take_along_axis(idx, order, axis=1)
+            best_scores = np.take_along_axis(best_scores, order, axis=1)
+            valid = best_scores > threshold
+            n_valid = order.shape[1]
+            top_idx[start:end, :n_valid] = np.where(valid, idx, -1)
+            top_scores[start:end, :n_valid] = np.where(
+                valid, best_scores, np.nan
+            )
+        return top_idx, top_scores
+
+
 def merge_dicts(*dict_args):
     """
     Given any number of dicts, shallow copy and merge into a new dict,
@@ -98,6 +399,200 @@ def get_recommendations_ordered_by_distance(
     return recommended_listing_ids
 
 
+def _iter_by_descending_distance(recommendations):
+    """
+    Iterates over recommendations sorted by ascending distance from the
+    largest distance, keeping tied recommendations in their original order
+    like a stable sort(reverse=True) does.
+    """
+    end = len(recommendations)
+    while end:
+        start = end - 1
+        while (
+            start
+            and recommendations[start - 1][1] == recommendations[end - 1][1]
+        ):
+            start -= 1
+        for position in range(start, end):
+            yield recommendations[position]
+        end = start
+
+
+def merge_recommendations_ordered_by_distance(
+    model_id_to_ids, listing_ids, limit=None, reverse=False
+):
+    """
+    Streaming variant of get_recommendations_ordered_by_distance.
+    Recommendations of every listing must already be sorted by distance
+    in ascending order, so they are k-way merged lazily and deduplicated
+    on the fly, stopping as soon as the limit is reached. Tied
+    recommendations keep the order of get_recommendations_ordered_by_distance
+    for both values of reverse.
+
+    :param model_id_to_ids: dictionary of listing ids and their recommendations.
+    :param listing_ids: list of listing ids.
+    :param limit: maximum number of listing ids to return, None for all.
+    :param reverse: boolean indicating if the list should be reversed.
+    :return: list of listing ids ordered by distance.
+    """
+    recommendations = [
+        model_id_to_ids.get(listing_id, []) for listing_id in listing_ids
+    ]
+    if reverse:
+        recommendations = [
+            _iter_by_descending_distance(ids) for ids in recommendations
+        ]
+    seen = set()
+    recommended_listing_ids = []
+    if limit is not None and limit <= 0:
+        return recommended_listing_ids
+    for listing_id, _ in heapq.merge(
+        *recommendations, key=itemgetter(1), reverse=reverse
+    ):
+        if listing_id not in seen:
+            recommended_listing_ids.append(listing_id)
+            seen.add(listing_id)
+            if len(recommended_listing_ids) == limit:
+                break
+    return recommended_listing_ids
+
+
+class CompactRecommendations:
+    """
+    Compact array-backed (CSR-like) replacement of the model_id_to_ids
+    dictionary of listing ids and their recommendations.
+    Recommendations of the listing keys[i] are ids[offsets[i]:offsets[i+1]]
+    with distances[offsets[i]:offsets[i+1]]. It supports the same
+    .get(listing_id, []) access, so it can be passed to
+    get_recommendations_ordered_by_distance.
+
+    :param keys: sorted int64 array of listing ids.
+    :param offsets: int64 array of len(keys) + 1 offsets into ids/distances.
+    :param ids: int64 array of recommended listing ids.
+    :param distances: float32 array of recommendation distances.
+    """
+
+    array_names = ("keys", "offsets", "ids", "distances")
+
+    def __init__(self, keys, offsets, ids, distances):
+        self.keys = keys
+        self.offsets = offsets
+        self.ids = ids
+        self.distances = distances
+
+    @classmethod
+    def from_dict(cls, model_id_to_ids: dict):
+        """
+        Builds the structure from a dictionary of listing ids and their
+        recommendations as lists of tuples (listing_id, distance).
+
+        :param model_id_to_ids: dictionary of listing ids and their recommendations.
+        :return: CompactRecommendations instance.
+        """
+        keys = np.array(sorted(model_id_to_ids), dtype=np.int64)
+        counts = np.array(
+            [len(model_id_to_ids[key]) for key in keys.tolist()],
+            dtype=np.int64,
+        )
+        offsets = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+        ids = np.empty(offsets[-1], dtype=np.int64)
+        distances = np.empty(offsets[-1], dtype=np.float32)
+        for key, start, end in zip(
+            keys.tolist(), offsets[:-1].tolist(), offsets[1:].tolist()
+        ):
+            if end > start:
+                ids[start:end], distances[start:end] = zip(
+                    *model_id_to_ids[key]
+                )
+        return cls(keys, offsets, ids, distances)
+
+    def _position(self, listing_id):
+        if not isinstance(listing_id, (int, np.integer)):
+            return None
+        position = np.searchsorted(self.keys, listing_id)
+        if position < len(self.keys) and self.keys[position] == listing_id:
+            return position
+        return None
+
+    def get(self, listing_id, default=None):
+        """
+        Returns recommendations of a listing as a list of tuples
+        (listing_id, distance), or the default value if it is missing.
+        """
+        position = self._position(listing_id)
+        if position is None:
+            return default
+        start, end = self.offsets[position], self.offsets[position + 1]
+        return list(
+            zip(
+                self.ids[start:end].tolist(),
+                self.distances[start:end].tolist(),
+            )
+        )
+
+    def __getitem__(self, listing_id):
+        recommendations = self.get(listing_id)
+        if recommendations is None:
+            raise KeyError(listing_id)
+        return recommendations
+
+    def __contains__(self, listing_id):
+        return self._position(listing_id) is not None
+
+    def __len__(self):
+        return len(self.keys)
+
+    def save(self, path: str):
+        """
+        Saves the arrays as .npy files into a directory.
+
+        :param path: path of the directory.
+        """
+        os.makedirs(path, exist_ok=True)
+        for name in self.array_names:
+            np.save(os.path.join(path, f"{name}.npy"), getattr(self, name))
+
+    @classmethod
+    def load(cls, path: str, mmap_mode: Optional[str] = "r"):
+        """
+        Loads the arrays saved with save, memory-mapped by default.
+
+        :param path: path of the directory.
+        :param mmap_mode: memory-map mode passed to np.load, None to read
+            the arrays into memory.
+        :return: CompactRecommendations instance.
+        """
+        return cls(
+            *(
+                np.load(os.path.join(path, f"{name}.npy"), mmap_mode=mmap_mode)
+                for name in cls.array_names
+            )
+        )
+
+
+@lru_cache(maxsize=1024)
+def compile_path(object_path, separator="."):
+    """
+    Splits a path into its components. The result is cached, so every
+    distinct path is parsed only once.
+
+    :param object_path: The path to split.
+    :param separator: The separator used to split the path into components.
+    :return: Tuple of the path components.
+    """
+    return tuple(object_path.split(separator))
+
+
+def _walk(input_dict, path_components, default_value):
+    d = input_dict
+    for component in path_components:
+        if component in d:
+            d = d[component]
+        else:
+            return default_value
+    return d
+
+
 def deep_get(input_dict, object_path, default_value=None, separator="."):
     """
     Performs a deep get on a dictionary, returning the value at the specified
@@ -111,17 +606,31 @@ def deep_get(input_dict, object_path, default_value=None, separator="."):
     :param separator: The separator used to split the path into components.
     :return: The value at the specified path, or the default value if the path does not exist.
     """
+    path_components = compile_path(object_path, separator)
+    d = _walk(input_dict, path_components[:-1], _MISSING)
+    if d is _MISSING:
+        return default_value
+    return d.get(path_components[-1], default_value)
 
-    def _deep_get(d, path_components):
-        if len(path_components) == 1:
-            return d.get(path_components[0], default_value)
-        else:
-            if path_components[0] in d:
-                return _deep_get(d[path_components[0]], path_components[1:])
-            else:
-                return default_value
 
-    return _deep_get(input_dict, object_path.split(separator))
+def deep_get_many(
+    input_dict, object_path, keys, default_value=None, separator="."
+):
+    """
+    Performs a deep get of many keys sharing the same parent path in one
+    traversal. Equivalent to deep_get of every f"{object_path}.{key}" path.
+
+    :param input_dict: The dictionary to perform the deep get on.
+    :param object_path: The path to the parent of the values to be returned.
+    :param keys: The keys of the values to be returned.
+    :param default_value: The default value to be returned if a path does not exist.
+    :param separator: The separator used to split the path into components.
+    :return: List of the values of the keys, in the same order.
+    """
+    d = _walk(input_dict, compile_path(object_path, separator), _MISSING)
+    if d is _MISSING:
+        return [default_value] * len(keys)
+    return [d.get(key, default_value) for key in keys]
 
 
 def isnull(value: Any) -> bool:
@@ -267,6 +776,228 @@ def normalise_price(listing_info):
         return None
 
 
+def isnull_array(values) -> np.ndarray:
+    """
+    Vectorized counterpart of isnull for arrays of scalars.
+    Returns a boolean array, True for None and nan values.
+    """
+    values = np.asarray(values, dtype=object)
+    return np.equal(values, None) | np.not_equal(values, values)
+
+
+def _round_prices(prices):
+    """
+    Rounds prices to two decimals exactly like float("{:.2f}".format(price)).
+    Values whose scaled fractional part is too close to .5 for the float
+    rounding to be trusted are formatted one by one.
+    """
+    scaled = prices * 100
+    rounded = np.rint(scaled) / 100
+    (uncertain,) = np.where(
+        np.abs(scaled - np.floor(scaled) - 0.5)
+        <= 2 * np.spacing(np.abs(scaled))
+    )
+    for idx in uncertain:
+        rounded[idx] = float("{:.2f}".format(prices[idx]))
+    return rounded
+
+
+def normalise_price_columns(
+    offer_type,
+    rent_interval,
+    rent_area,
+    rent_gross,
+    buy_price,
+    buy_area,
+    living_space,
+    total_floor_space,
+    lot_size,
+):
+    """
+    Vectorized counterpart of normalise_price which normalises the prices of
+    many listings to monthly prices at once.
+    String arguments are arrays of listing.offerType, listing.prices.rent.interval,
+    listing.prices.rent.area and listing.prices.buy.area values (None if missing),
+    numeric arguments are arrays of listing.prices.rent.gross,
+    listing.prices.buy.price and listing.characteristics livingSpace,
+    totalFloorSpace and lotSize values (None or nan if missing).
+
+    :return: tuple of the float64 array of normalised prices (nan where
+        normalise_price returns None) and the boolean array of listings for
+        which normalise_price raises ValueError (undefined space).
+    """
+    offer_type = np.asarray(offer_type, dtype=object)
+    rent_interval = np.asarray(rent_interval, dtype=object)
+    rent_area = np.asarray(rent_area, dtype=object)
+    buy_area = np.asarray(buy_area, dtype=object)
+    rent_gross = np.asarray(rent_gross, dtype=np.float64)
+    buy_price = np.asarray(buy_price, dtype=np.float64)
+    living_space = np.asarray(living_space, dtype=np.float64)
+    total_floor_space = np.asarray(total_floor_space, dtype=np.float64)
+    lot_size = np.asarray(lot_size, dtype=np.float64)
+
+    space = np.where(
+        ~np.isnan(living_space),
+        living_space,
+        np.where(~np.isnan(total_floor_space), total_floor_space, lot_size),
+    )
+    no_space = np.isnan(space)
+    positive_space = space > 0
+
+    rent = (
+        (offer_type == "RENT")
+        & (rent_area != "KM2")
+        & ~np.isnan(rent_gross)
+        & (rent_gross > 0)
+    )
+    rent_m2 = rent_area == "M2"
+    day = rent & (rent_interval == "DAY")
+    year = rent & (rent_interval == "YEAR")
+    month = rent & ((rent_interval == "MONTH") | (rent_interval == "ONETIME"))
+    week = rent & (rent_interval == "WEEK")
+
+    buy = (offer_type == "BUY") & ~np.isnan(buy_price) & (buy_price > 0)
+    buy_m2 = buy & (buy_area == "M2") & positive_space
+    buy_all = buy & ((buy_area == "ALL") | isnull_array(buy_area))
+
+    with np.errstate(invalid="ignore"):
+        prices = np.select(
+            [
+                day & no_space,
+                year & ~rent_m2,
+                month,
+                week,
+                rent & no_space,
+                year & rent_m2 & positive_space,
+                day & rent_m2 & positive_space,
+                buy_m2,
+                buy_all,
+            ],
+            [
+                rent_gross * 365 / 12,
+                rent_gross / 12,
+                rent_gross,
+                rent_gross * 52 / 12,
+                np.nan,
+                rent_gross * space / 12,
+                rent_gross * space * 365 / 12,
+                buy_price * space,
+                buy_price,
+            ],
+            default=np.nan,
+        )
+    errors = rent & no_space & ~(day | (year & ~rent_m2) | month | week)
+    return _round_prices(prices), errors
+
+
+_LISTING_CHARACTERISTICS = (
+    ("SPACE", "livingSpace", convert_to_float),
+    ("FLOORSPACE", "totalFloorSpace", convert_to_float),
+    ("SINGLEFLOORSPACE", "singleFloorSpace", convert_to_float),
+    ("LOTSIZE", "lotSize", convert_to_float),
+    ("NUMBEROFROOMS", "numberOfRooms", convert_to_float),
+    ("FLOOR", "floor", convert_to_float),
+    ("NUMBEROFFLOORS", "numberOfFloors", convert_to_float),
+    ("YEARBUILT", "yearBuilt", convert_to_float),
+    ("AREPETSALLOWED", "arePetsAllowed", None),
+    ("HASELEVATOR", "hasElevator", None),
+    ("HASPARKING", "hasParking", None),
+    ("HASGARAGE", "hasGarage", None),
+    ("HASNICEVIEW", "hasNiceView", None),
+    ("HASSTEAMER", "hasSteamer", None),
+    ("HASWASHINGMACHINE", "hasWashingMachine", None),
+    ("HASTUMBLEDRYER", "hasTumbleDryer", None),
+    ("HASCABLETV", "hasCableTv", None),
+    ("HASFLATSHARINGCOMMUNITY", "hasFlatSharingCommunity", None),
+    ("ISCHILDFRIENDLY", "isChildFriendly", None),
+    ("ISREFURBISHED", "isRefurbished", None),
+    ("YEARLASTRENOVATED", "yearLastRenovated", convert_to_float),
+    ("ISWHEELCHAIRACCESSIBLE", "isWheelchairAccessible", None),
+    ("ISMINERGIECERTIFIED", "isMinergieCertified", None),
+    ("ISMINERGIEGENERAL", "isMinergieGeneral", None),
+    ("ISNEWBUILDING", "isNewBuilding", None),
+    ("ISOLDBUILDING", "isOldBuilding", None),
+    ("ISGROUNDFLOOR", "isGroundFloor", None),
+    ("HASATTIC", "hasAttic", None),
+    ("HASBALCONY", "hasBalcony", None),
+    ("HASGARDENSHED", "hasGardenShed", None),
+    ("HASSWIMMINGPOOL", "hasSwimmingPool", None),
+    ("HASFIREPLACE", "hasFireplace", None),
+)
+"""
+Features read from listing.characteristics: (feature, key, converter).
+"""
+
+_LISTING_CHARACTERISTICS_KEYS = tuple(
+    key for _, key, _ in _LISTING_CHARACTERISTICS
+)
+
+
+LISTING_FEATURES = (
+    "LISTING_ID",
+    "CANTON",
+    "CATEGORIES",
+    "CATEGORY_CODE",
+    "COUNTRY",
+    "OFFERTYPE",
+    "LATITUDE",
+    "LONGITUDE",
+    "PRICE",
+    *(feature for feature, _, _ in _LISTING_CHARACTERISTICS),
+    "POSTALCODE",
+)
+"""
+Names of the features returned by get_listing_features, in order.
+"""
+
+_INTEGER_FEATURES = {"LISTING_ID", "POSTALCODE"}
+_NUMERIC_FEATURES = {
+    "LATITUDE",
+    "LONGITUDE",
+    "PRICE",
+    *(
+        feature
+        for feature, _, convert in _LISTING_CHARACTERISTICS
+        if convert is convert_to_float
+    ),
+} | _INTEGER_FEATURES
+
+
+def _get_listing_feature_values(listing_info):
+    """
+    Returns the values of the features of a listing in LISTING_FEATURES order.
+    """
+    categories = deep_get(listing_info, "listing.categories", [])
+    region, country, postal_code = deep_get_many(
+        listing_info, "listing.address", ("region", "country", "postalCode")
+    )
+    latitude, longitude = deep_get_many(
+        listing_info,
+        "listing.address.geoCoordinates",
+        ("latitude", "longitude"),
+    )
+    values = [
+        convert_to_int(deep_get(listing_info, "listing.id")),
+        region,
+        ",".join(categories),
+        category_to_code.get(categories[0], None),
+        country,
+        deep_get(listing_info, "listing.offerType"),
+        convert_to_float(latitude),
+        convert_to_float(longitude),
+        normalise_price(listing_info),
+    ]
+    characteristics = deep_get_many(
+        listing_info, "listing.characteristics", _LISTING_CHARACTERISTICS_KEYS
+    )
+    for (_, _, convert), value in zip(
+        _LISTING_CHARACTERISTICS, characteristics
+    ):
+        values.append(value if convert is None else convert(value))
+    values.append(convert_to_int(postal_code))
+    return values
+
+
 def get_listing_features(listing_info):
     """
     Returns a dictionary containing the features of a listing needed for
@@ -275,119 +1006,60 @@ def get_listing_features(listing_info):
     :param listing_info: The listing info dictionary in HgRets schema.
     :return: A dictionary containing the features of a listing.
     """
-    categories = deep_get(listing_info, "listing.categories", [])
-    return {
-        "LISTING_ID": convert_to_int(deep_get(listing_info, "listing.id")),
-        "CANTON": deep_get(listing_info, "listing.address.region"),
-        "CATEGORIES": ",".join(categories),
-        "CATEGORY_CODE": category_to_code.get(categories[0], None),
-        "COUNTRY": deep_get(listing_info, "listing.address.country"),
-        "OFFERTYPE": deep_get(listing_info, "listing.offerType"),
-        "LATITUDE": convert_to_float(
-            deep_get(listing_info, "listing.address.geoCoordinates.latitude")
-        ),
-        "LONGITUDE": convert_to_float(
-            deep_get(listing_info, "listing.address.geoCoordinates.longitude")
-        ),
-        "PRICE": normalise_price(listing_info),
-        "SPACE": convert_to_float(
-            deep_get(listing_info, "listing.characteristics.livingSpace")
-        ),
-        "FLOORSPACE": convert_to_float(
-            deep_get(listing_info, "listing.characteristics.totalFloorSpace")
-        ),
-        "SINGLEFLOORSPACE": convert_to_float(
-            deep_get(listing_info, "listing.characteristics.singleFloorSpace")
-        ),
-        "LOTSIZE": convert_to_float(
-            deep_get(listing_info, "listing.characteristics.lotSize")
-        ),
-        "NUMBEROFROOMS": convert_to_float(
-            deep_get(listing_info, "listing.characteristics.numberOfRooms")
-        ),
-        "FLOOR": convert_to_float(
-            deep_get(listing_info, "listing.characteristics.floor")
-        ),
-        "NUMBEROFFLOORS": convert_to_float(
-            deep_get(listing_info, "listing.characteristics.numberOfFloors")
-        ),
-        "YEARBUILT": convert_to_float(
-            deep_get(listing_info, "listing.characteristics.yearBuilt")
-        ),
-        "AREPETSALLOWED": deep_get(
-            listing_info, "listing.characteristics.arePetsAllowed"
-        ),
-        "HASELEVATOR": deep_get(
-            listing_info, "listing.characteristics.hasElevator"
-        ),
-        "HASPARKING": deep_get(
-            listing_info, "listing.characteristics.hasParking"
-        ),
-        "HASGARAGE": deep_get(
-            listing_info, "listing.characteristics.hasGarage"
-        ),
-        "HASNICEVIEW": deep_get(
-            listing_info, "listing.characteristics.hasNiceView"
-        ),
-        "HASSTEAMER": deep_get(
-            listing_info, "listing.characteristics.hasSteamer"
-        ),
-        "HASWASHINGMACHINE": deep_get(
-            listing_info, "listing.characteristics.hasWashingMachine"
-        ),
-        "HASTUMBLEDRYER": deep_get(
-            listing_info, "listing.characteristics.hasTumbleDryer"
-        ),
-        "HASCABLETV": deep_get(
-            listing_info, "listing.characteristics.hasCableTv"
-        ),
-        "HASFLATSHARINGCOMMUNITY": deep_get(
-            listing_info, "listing.characteristics.hasFlatSharingCommunity"
-        ),
-        "ISCHILDFRIENDLY": deep_get(
-            listing_info, "listing.characteristics.isChildFriendly"
-        ),
-        "ISREFURBISHED": deep_get(
-            listing_info, "listing.characteristics.isRefurbished"
-        ),
-        "YEARLASTRENOVATED": convert_to_float(
-            deep_get(listing_info, "listing.characteristics.yearLastRenovated")
-        ),
-        "ISWHEELCHAIRACCESSIBLE": deep_get(
-            listing_info, "listing.characteristics.isWheelchairAccessible"
-        ),
-        "ISMINERGIECERTIFIED": deep_get(
-            listing_info, "listing.characteristics.isMinergieCertified"
-        ),
-        "ISMINERGIEGENERAL": deep_get(
-            listing_info, "listing.characteristics.isMinergieGeneral"
-        ),
-        "ISNEWBUILDING": deep_get(
-            listing_info, "listing.characteristics.isNewBuilding"
-        ),
-        "ISOLDBUILDING": deep_get(
-            listing_info, "listing.characteristics.isOldBuilding"
-        ),
-        "ISGROUNDFLOOR": deep_get(
-            listing_info, "listing.characteristics.isGroundFloor"
-        ),
-        "HASATTIC": deep_get(listing_info, "listing.characteristics.hasAttic"),
-        "HASBALCONY": deep_get(
-            listing_info, "listing.characteristics.hasBalcony"
-        ),
-        "HASGARDENSHED": deep_get(
-            listing_info, "listing.characteristics.hasGardenShed"
-        ),
-        "HASSWIMMINGPOOL": deep_get(
-            listing_info, "listing.characteristics.hasSwimmingPool"
-        ),
-        "HASFIREPLACE": deep_get(
-            listing_info, "listing.characteristics.hasFireplace"
-        ),
-        "POSTALCODE": convert_to_int(
-            deep_get(listing_info, "listing.address.postalCode")
-        ),
+    return dict(
+        zip(LISTING_FEATURES, _get_listing_feature_values(listing_info))
+    )
+
+
+def get_listing_features_columns(listings_info, n_listings=None):
+    """
+    Batch counterpart of get_listing_features which writes the features of
+    many listings directly into preallocated column arrays:
+    float64 (nan for missing values) for numeric features, object for the
+    others. LISTING_ID and POSTALCODE are int64 when no value is missing.
+    The result can be turned into the DataFrame expected by the
+    features_to_tags pipelines with pd.DataFrame(columns).
+
+    :param listings_info: iterable of listing info dictionaries in HgRets schema.
+    :param n_listings: number of listings, needed only if listings_info
+        has no length, e.g. a generator.
+    :return: A dictionary of feature names and their column arrays,
+        in LISTING_FEATURES order.
+    """
+    if n_listings is None:
+        if not hasattr(listings_info, "__len__"):
+            listings_info = list(listings_info)
+        n_listings = len(listings_info)
+    columns = {
+        feature: (
+            np.full(n_listings, np.nan)
+            if feature in _NUMERIC_FEATURES
+            else np.full(n_listings, None, dtype=object)
+        )
+        for feature in LISTING_FEATURES
     }
+    arrays = list(columns.values())
+
+    row = -1
+    for row, listing_info in enumerate(listings_info):
+        if row >= n_listings:
+            raise ValueError(
+                f"Expected {n_listings} listings, got more listings"
+            )
+        for array, value in zip(
+            arrays, _get_listing_feature_values(listing_info)
+        ):
+            if value is not None:
+                array[row] = value
+    if row + 1 != n_listings:
+        raise ValueError(
+            f"Expected {n_listings} listings, got {row + 1} listings"
+        )
+
+    for feature in _INTEGER_FEATURES:
+        if not np.isnan(columns[feature]).any():
+            columns[feature] = columns[feature].astype(np.int64)
+    return columns
 
 
 category_to_code = {
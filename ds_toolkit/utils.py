@@ -1,9 +1,15 @@
+import bz2
+import gzip
 import json
+import lzma
 import pickle
+import uuid
+from concurrent.futures import ThreadPoolExecutor
 from enum import Enum
-from io import BytesIO, StringIO
-from typing import Any
+from io import BytesIO, RawIOBase, StringIO, TextIOWrapper
+from typing import Any, Optional
 
+import numpy as np
 from botocore.client import BaseClient
 from datadog import initialize
 from datadog.api.metrics import Metric
@@ -14,6 +20,15 @@ def send_datadog_metric(options, *args, **kwargs):
     Metric.send(*args, **kwargs)
 
 
+MIN_PART_SIZE = 5 * 1024 * 1024
+DEFAULT_PART_SIZE = 64 * 1024 * 1024
+DEFAULT_MAX_CONCURRENCY = 8
+MIN_OUT_OF_BAND_BUFFER_SIZE = 1024 * 1024
+PICKLE_BUFFERS_METADATA = "pickle-buffers"
+PICKLE_DUMP_ID_METADATA = "pickle-dump-id"
+COMPRESSION_METADATA = "compression"
+
+
 class ObjectFormat(Enum):
     """
     Enum to define the format of the object
@@ -21,6 +36,469 @@ class ObjectFormat(Enum):
 
     PICKLE = "pickle"
     JSON = "json"
+    NUMPY = "numpy"
+    PICKLE5 = "pickle5"
+
+
+_COMPRESSION_CODECS = {
+    "gzip": lambda stream, mode: gzip.GzipFile(
+        fileobj=stream, mode=mode, compresslevel=6
+    ),
+    "bz2": bz2.BZ2File,
+    "lzma": lzma.LZMAFile,
+}
+
+
+def register_compression_codec(name: str, open_stream):
+    """
+    Registers a compression codec usable by dump_object_to_s3 and
+    load_object_from_s3.
+
+    :param name: Name of the codec, recorded in the S3 object metadata
+    :param open_stream: Function taking a binary stream and a mode, "rb" or
+        "wb", and returning a file-like object decompressing from or
+        compressing into the stream. Closing it must not close the stream.
+    :return: None
+    """
+    _COMPRESSION_CODECS[name] = open_stream
+
+
+def _get_compression_codec(compression: str):
+    """
+    Returns the stream opening function of a registered codec.
+    """
+    if compression not in _COMPRESSION_CODECS:
+        raise ValueError(
+            f"Unknown compression {compression!r}, "
+            f"available: {sorted(_COMPRESSION_CODECS)}"
+        )
+    return _COMPRESSION_CODECS[compression]
+
+
+def _open_compressed_stream(stream, compression: str, mode: str):
+    """
+    Opens a compressing or decompressing file-like object over a stream.
+    """
+    return _get_compression_codec(compression)(stream, mode)
+
+
+try:
+    import zstandard
+except ImportError:
+    pass
+else:
+
+    def _open_zstd_stream(stream, mode):
+        if "w" in mode:
+            return zstandard.ZstdCompressor().stream_writer(
+                stream, closefd=False
+            )
+        return zstandard.ZstdDecompressor().stream_reader(
+            stream, closefd=False
+        )
+
+    register_compression_codec("zstd", _open_zstd_stream)
+
+try:
+    import lz4.frame
+except ImportError:
+    pass
+else:
+    register_compression_codec("lz4", lz4.frame.LZ4FrameFile)
+
+
+class S3MultipartWriter(RawIOBase):
+    """
+    Writable binary stream uploading its content to S3 as a multipart upload.
+    Written data is buffered until a full part is available, so at most
+    one part is held in memory. The upload is completed only by an explicit
+    close or a context manager exiting cleanly. It is aborted if
+    the context manager exits with an exception, if completing it fails,
+    or if the stream is garbage-collected without being closed, so
+    a truncated object is never published.
+
+    :param client: S3 client
+    :param bucket: S3 bucket
+    :param key: S3 key
+    :param part_size: Size of the uploaded parts in bytes, at least 5 MiB
+    :param kwargs: Extra arguments of create_multipart_upload, e.g. Metadata
+    """
+
+    def __init__(
+        self,
+        client: BaseClient,
+        bucket: str,
+        key: str,
+        part_size: int = DEFAULT_PART_SIZE,
+        **kwargs,
+    ):
+        if part_size < MIN_PART_SIZE:
+            raise ValueError(
+                f"part_size must be at least {MIN_PART_SIZE} bytes"
+            )
+        super().__init__()
+        self.client = client
+        self.bucket = bucket
+        self.key = key
+        self.part_size = part_size
+        self.parts = []
+        self.buffer = bytearray()
+        self.upload_id = None
+        self.upload_id = client.create_multipart_upload(
+            Bucket=bucket, Key=key, **kwargs
+        )["UploadId"]
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        data = memoryview(b).cast("B")
+        size = len(data)
+        while len(data):
+            if not self.buffer and len(data) >= self.part_size:
+                # Full parts are uploaded straight from the written data
+                self._upload_part(data[: self.part_size])
+                data = data[self.part_size :]
+                continue
+            free = self.part_size - len(self.buffer)
+            self.buffer += data[:free]
+            data = data[free:]
+            if len(self.buffer) == self.part_size:
+                self._upload_buffer()
+        return size
+
+    def _upload_buffer(self):
+        self._upload_part(self.buffer)
+        self.buffer.clear()
+
+    def _upload_part(self, data):
+        part_number = len(self.parts) + 1
+        response = self.client.upload_part(
+            Body=bytes(data),
+            Bucket=self.bucket,
+            Key=self.key,
+            PartNumber=part_number,
+            UploadId=self.upload_id,
+        )
+        self.parts.append(
+            {"ETag": response["ETag"], "PartNumber": part_number}
+        )
+
+    def close(self):
+        if self.closed:
+            return
+        try:
+            if self.buffer or not self.parts:
+                self._upload_buffer()
+            self.client.complete_multipart_upload(
+                Bucket=self.bucket,
+                Key=self.key,
+                UploadId=self.upload_id,
+                MultipartUpload={"Parts": self.parts},
+            )
+        except BaseException:
+            self.abort()
+            raise
+        super().close()
+
+    def abort(self):
+        """
+        Aborts the multipart upload, discarding the uploaded parts.
+        """
+        if self.closed:
+            return
+        try:
+            if self.upload_id is not None:
+                self.client.abort_multipart_upload(
+                    Bucket=self.bucket, Key=self.key, UploadId=self.upload_id
+                )
+        finally:
+            super().close()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is not None:
+            self.abort()
+        else:
+            self.close()
+
+    def __del__(self):
+        # IOBase.__del__ would close, i.e. complete, an unfinished upload
+        if hasattr(self, "upload_id"):
+            self.abort()
+
+
+class _WriteOnlyStream(RawIOBase):
+    """
+    Write-only view of a binary stream. Hiding seek support makes zipfile
+    write .npz archives sequentially instead of seeking back, which
+    compressed and multipart upload streams do not support.
+    """
+
+    def __init__(self, stream):
+        super().__init__()
+        self.stream = stream
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        return self.stream.write(b)
+
+
+class _BufferReader(RawIOBase):
+    """
+    Readable binary stream over a bytes-like buffer. Unlike BytesIO, it
+    reads from a memoryview of the buffer instead of copying it.
+    """
+
+    def __init__(self, buff):
+        super().__init__()
+        self.view = memoryview(buff).cast("B")
+        self.position = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def readinto(self, b):
+        data = self.view[self.position : self.position + len(b)]
+        b[: len(data)] = data
+        self.position += len(data)
+        return len(data)
+
+    def seek(self, offset, whence=0):
+        if whence == 1:
+            offset += self.position
+        elif whence == 2:
+            offset += len(self.view)
+        if offset < 0:
+            raise ValueError(f"Negative seek position {offset}")
+        self.position = offset
+        return self.position
+
+    def tell(self):
+        return self.position
+
+    def close(self):
+        if not self.closed:
+            self.view.release()
+        super().close()
+
+
+def _dump_to_stream(
+    obj: Any,
+    stream,
+    format: ObjectFormat,
+    compression: Optional[str] = None,
+):
+    """
+    Serialises an object into a writable binary stream.
+    Pickle protocol 5 writes large buffers such as NumPy arrays straight
+    into the stream instead of copying them into an intermediate bytes.
+    """
+    if compression is not None:
+        with _open_compressed_stream(stream, compression, "wb") as compressed:
+            _dump_to_stream(obj, compressed, format)
+    elif format == ObjectFormat.PICKLE:
+        pickle.dump(obj, stream, protocol=5)
+    elif format == ObjectFormat.JSON:
+        text_stream = TextIOWrapper(stream, encoding="utf-8")
+        json.dump(obj, text_stream)
+        text_stream.flush()
+        text_stream.detach()
+    elif format == ObjectFormat.NUMPY:
+        if isinstance(obj, np.ndarray):
+            np.save(stream, obj, allow_pickle=False)
+        else:
+            np.savez(_WriteOnlyStream(stream), **obj)
+
+
+def _load_from_stream(stream, format: ObjectFormat) -> Any:
+    """
+    Deserialises an object from a readable binary stream.
+    """
+    if format == ObjectFormat.PICKLE:
+        return pickle.load(stream)
+    elif format == ObjectFormat.JSON:
+        return json.load(stream)
+    elif format == ObjectFormat.NUMPY:
+        return _load_numpy(stream.read())
+
+
+def _load_npy_from_buffer(buff) -> np.ndarray:
+    """
+    Loads an array saved in the .npy format as a view of the buffer.
+    The array is read-only if the buffer is bytes and writable if it is
+    a bytearray.
+    """
+    version = (buff[6], buff[7])
+    if version == (1, 0):
+        header_end = 10 + int.from_bytes(buff[8:10], "little")
+        read_header = np.lib.format.read_array_header_1_0
+    elif version == (2, 0):
+        header_end = 12 + int.from_bytes(buff[8:12], "little")
+        read_header = np.lib.format.read_array_header_2_0
+    else:
+        raise ValueError(f"Unsupported .npy format version {version}")
+    header = BytesIO(bytes(buff[:header_end]))
+    np.lib.format.read_magic(header)
+    shape, fortran_order, dtype = read_header(header)
+    return np.frombuffer(
+        buff, dtype=dtype, count=int(np.prod(shape)), offset=header_end
+    ).reshape(shape, order="F" if fortran_order else "C")
+
+
+def _load_numpy(buff):
+    """
+    Loads an array from a .npy buffer or a dictionary of arrays from
+    a .npz buffer.
+    """
+    if buff[:2] == b"PK":
+        with np.load(_BufferReader(buff)) as data:
+            return {name: data[name] for name in data.files}
+    return _load_npy_from_buffer(buff)
+
+
+def _get_buffer_key(key: str, dump_id: str, index: int) -> str:
+    """
+    Returns the S3 key of an out-of-band pickle buffer of an object.
+    """
+    return f"{key}.buffers/{dump_id}/{index}"
+
+
+def _put_bytes(
+    client: BaseClient,
+    bucket: str,
+    key: str,
+    data,
+    part_size: Optional[int],
+    **kwargs,
+):
+    """
+    Uploads bytes-like data, with a multipart upload if it is larger than
+    part_size (DEFAULT_PART_SIZE if None), so at most one part is copied
+    at a time.
+    """
+    part_size = part_size or DEFAULT_PART_SIZE
+    if len(data) > part_size:
+        with S3MultipartWriter(
+            client, bucket, key, part_size, **kwargs
+        ) as writer:
+            writer.write(data)
+    else:
+        client.put_object(Body=bytes(data), Bucket=bucket, Key=key, **kwargs)
+
+
+def _delete_stale_buffers(
+    client: BaseClient, bucket: str, key: str, dump_id: str
+):
+    """
+    Deletes the out-of-band pickle buffers of an object which do not
+    belong to the given dump.
+    """
+    prefix = f"{key}.buffers/"
+    current_prefix = f"{prefix}{dump_id}/"
+    kwargs = {"Bucket": bucket, "Prefix": prefix}
+    while True:
+        response = client.list_objects_v2(**kwargs)
+        stale = [
+            {"Key": content["Key"]}
+            for content in response.get("Contents", [])
+            if not content["Key"].startswith(current_prefix)
+        ]
+        if stale:
+            client.delete_objects(
+                Bucket=bucket, Delete={"Objects": stale, "Quiet": True}
+            )
+        if not response.get("IsTruncated"):
+            break
+        kwargs["ContinuationToken"] = response["NextContinuationToken"]
+
+
+def _dump_pickle5_to_s3(
+    client: BaseClient,
+    obj: Any,
+    bucket: str,
+    key: str,
+    part_size: Optional[int],
+):
+    """
+    Pickles an object with protocol 5, uploading every buffer of at least
+    MIN_OUT_OF_BAND_BUFFER_SIZE bytes, e.g. NumPy array data, as
+    a separate object as soon as the pickler reaches it. Buffer keys
+    contain an id unique to the dump, so a new dump never overwrites
+    the buffers of the current one. The pickle stream itself is uploaded
+    last with the dump id and the number of buffers in its metadata, then
+    the buffers of previous dumps are deleted.
+    """
+    dump_id = uuid.uuid4().hex
+    metadata = {PICKLE_DUMP_ID_METADATA: dump_id}
+    buffer_count = 0
+
+    def upload_buffer(buffer):
+        nonlocal buffer_count
+        data = buffer.raw()
+        if data.nbytes < MIN_OUT_OF_BAND_BUFFER_SIZE:
+            return True
+        buffer_key = _get_buffer_key(key, dump_id, buffer_count)
+        _put_bytes(
+            client, bucket, buffer_key, data, part_size, Metadata=metadata
+        )
+        buffer_count += 1
+        return False
+
+    data = pickle.dumps(obj, protocol=5, buffer_callback=upload_buffer)
+    _put_bytes(
+        client,
+        bucket,
+        key,
+        data,
+        part_size,
+        Metadata={**metadata, PICKLE_BUFFERS_METADATA: str(buffer_count)},
+    )
+    _delete_stale_buffers(client, bucket, key, dump_id)
+
+
+def _load_pickle5_from_s3(
+    client: BaseClient,
+    bucket: str,
+    key: str,
+    part_size: Optional[int],
+    max_concurrency: int,
+) -> Any:
+    """
+    Loads an object dumped with _dump_pickle5_to_s3. The buffers are
+    downloaded into bytearrays which the unpickled arrays use in place.
+    Raises ValueError if a buffer does not belong to the same dump as
+    the pickle stream.
+    """
+    head = client.head_object(Bucket=bucket, Key=key)
+    dump_id = head["Metadata"][PICKLE_DUMP_ID_METADATA]
+    part_size = part_size or DEFAULT_PART_SIZE
+    data = _download_into_buffer(
+        client, bucket, key, head, part_size, max_concurrency
+    )
+    buffers = []
+    for index in range(int(head["Metadata"][PICKLE_BUFFERS_METADATA])):
+        buffer_key = _get_buffer_key(key, dump_id, index)
+        buffer_head = client.head_object(Bucket=bucket, Key=buffer_key)
+        if buffer_head["Metadata"].get(PICKLE_DUMP_ID_METADATA) != dump_id:
+            raise ValueError(
+                f"Buffer {buffer_key} does not belong to dump {dump_id}"
+            )
+        buffers.append(
+            _download_into_buffer(
+                client,
+                bucket,
+                buffer_key,
+                buffer_head,
+                part_size,
+                max_concurrency,
+            )
+        )
+    return pickle.loads(data, buffers=buffers)
 
 
 def dump_object_to_s3(
@@ -29,17 +507,54 @@ def dump_object_to_s3(
     bucket: str,
     key: str,
     format: ObjectFormat = ObjectFormat.PICKLE,
+    part_size: Optional[int] = None,
+    compression: Optional[str] = None,
 ):
     """
     Dump an object to S3
 
     :param client: S3 client
-    :param obj: Object to dump
+    :param obj: Object to dump, an array or a dictionary of arrays for numpy
     :param bucket: S3 bucket
     :param key: S3 key
-    :param format: Format of the object, can be pickle or json
+    :param format: Format of the object, can be pickle, json, numpy or pickle5.
+        pickle5 stores the large buffers of the object, e.g. NumPy arrays,
+        as separate objects under "<key>.buffers/<dump id>/<index>".
+    :param part_size: If set, the object is serialised straight into
+        a multipart upload with parts of this size in bytes (at least 5 MiB),
+        so the serialised object is never fully held in memory. With pickle5
+        it applies to the pickle stream and every buffer.
+    :param compression: Compression codec, e.g. gzip, bz2 or lzma, applied
+        while serialising and recorded in the object metadata, so
+        load_object_from_s3 decompresses the object automatically.
+        Not supported with pickle5, whose buffers are loaded in place.
     :return: None
     """
+    if format == ObjectFormat.PICKLE5:
+        if compression is not None:
+            raise ValueError("compression is not supported with pickle5")
+        _dump_pickle5_to_s3(client, obj, bucket, key, part_size)
+        return
+
+    kwargs = {}
+    if compression is not None:
+        _get_compression_codec(compression)
+        kwargs["Metadata"] = {COMPRESSION_METADATA: compression}
+
+    if part_size is not None:
+        with S3MultipartWriter(
+            client, bucket, key, part_size, **kwargs
+        ) as writer:
+            _dump_to_stream(obj, writer, format, compression)
+        return
+
+    if format == ObjectFormat.NUMPY or compression is not None:
+        buff = BytesIO()
+        _dump_to_stream(obj, buff, format, compression)
+        buff.seek(0)
+        client.put_object(Body=buff, Bucket=bucket, Key=key, **kwargs)
+        return
+
     if format == ObjectFormat.PICKLE:
         buff = BytesIO()
         buff.write(pickle.dumps(obj))
@@ -55,11 +570,70 @@ def dump_object_to_s3(
     )
 
 
+def download_s3_object_into_buffer(
+    client: BaseClient,
+    bucket: str,
+    key: str,
+    part_size: int = DEFAULT_PART_SIZE,
+    max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+) -> bytearray:
+    """
+    Downloads an S3 object with concurrent ranged get_object calls into
+    a preallocated buffer. Every range is requested with the ETag of the
+    object, so a concurrent overwrite fails the download instead of
+    mixing two versions.
+
+    :param client: S3 client
+    :param bucket: S3 bucket
+    :param key: S3 key
+    :param part_size: Size of the requested ranges in bytes
+    :param max_concurrency: Maximum number of concurrent requests
+    :return: Content of the object
+    """
+    head = client.head_object(Bucket=bucket, Key=key)
+    return _download_into_buffer(
+        client, bucket, key, head, part_size, max_concurrency
+    )
+
+
+def _download_into_buffer(
+    client: BaseClient,
+    bucket: str,
+    key: str,
+    head: dict,
+    part_size: int,
+    max_concurrency: int,
+) -> bytearray:
+    """
+    Downloads an S3 object described by its head_object response into
+    a preallocated buffer.
+    """
+    size = head["ContentLength"]
+    buffer = bytearray(size)
+    view = memoryview(buffer)
+
+    def download_range(start):
+        end = min(start + part_size, size)
+        body = client.get_object(
+            Bucket=bucket,
+            Key=key,
+            Range=f"bytes={start}-{end - 1}",
+            IfMatch=head["ETag"],
+        )["Body"]
+        view[start:end] = body.read()
+
+    with ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+        list(executor.map(download_range, range(0, size, part_size)))
+    return buffer
+
+
 def load_object_from_s3(
     client: BaseClient,
     bucket: str,
     key: str,
     format: ObjectFormat = ObjectFormat.PICKLE,
+    part_size: Optional[int] = None,
+    max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
 ) -> Any:
     """
     Load an object from S3
@@ -67,14 +641,46 @@ def load_object_from_s3(
     :param client: S3 client
     :param bucket: S3 bucket
     :param key: S3 key
-    :param format: Format of the object, can be pickle or json
-    :return: Loaded object
+    :param format: Format of the object, can be pickle, json, numpy or pickle5.
+        Arrays are loaded as views of the downloaded buffer, read-only
+        unless part_size is set. pickle5 buffers are always writable.
+    :param part_size: If set, the object is downloaded with concurrent
+        ranged requests of this size in bytes into a preallocated buffer,
+        which is deserialised in place.
+    :param max_concurrency: Maximum number of concurrent ranged requests
+    :return: Loaded object, decompressed with the codec recorded in its
+        metadata if it was dumped with compression
     """
-    buff = client.get_object(
-        Bucket=bucket,
-        Key=key,
-    )["Body"].read()
+    if format == ObjectFormat.PICKLE5:
+        return _load_pickle5_from_s3(
+            client, bucket, key, part_size, max_concurrency
+        )
+
+    if part_size is not None:
+        head = client.head_object(Bucket=bucket, Key=key)
+        compression = head.get("Metadata", {}).get(COMPRESSION_METADATA)
+        buff = _download_into_buffer(
+            client, bucket, key, head, part_size, max_concurrency
+        )
+        if compression is not None:
+            body = _BufferReader(buff)
+            del buff
+    else:
+        response = client.get_object(
+            Bucket=bucket,
+            Key=key,
+        )
+        compression = response.get("Metadata", {}).get(COMPRESSION_METADATA)
+        body = response["Body"]
+        if compression is None:
+            buff = body.read()
+
+    if compression is not None:
+        with _open_compressed_stream(body, compression, "rb") as stream:
+            return _load_from_stream(stream, format)
     if format == ObjectFormat.PICKLE:
         return pickle.loads(buff)
     elif format == ObjectFormat.JSON:
         return json.loads(buff)
+    elif format == ObjectFormat.NUMPY:
+        return _load_numpy(buff)
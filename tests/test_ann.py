@@ -0,0 +1,56 @@
+import numpy as np
+
+from ds_toolkit.ann import IVFIndex, evaluate_recall_at_k
+from ds_toolkit.recommendations_utils import get_cosine_similarity
+
+
+def test_ivf_index_query():
+    rng = np.random.default_rng(0)
+    item_representations = rng.normal(size=(500, 16))
+    index = IVFIndex(n_lists=10, n_probe=10, random_state=0).build(
+        item_representations
+    )
+
+    source_vector = item_representations[42]
+    idx, scores = index.query(source_vector, k=10)
+    expected = np.argsort(
+        -get_cosine_similarity(source_vector, item_representations)
+    )[:10]
+    assert idx.tolist() == expected.tolist()
+    assert np.all(np.diff(scores) <= 0)
+
+
+def test_ivf_index_save_load(tmp_path):
+    rng = np.random.default_rng(0)
+    item_representations = rng.normal(size=(200, 8))
+    index = IVFIndex(n_lists=8, n_probe=2, random_state=0).build(
+        item_representations
+    )
+    path = str(tmp_path / "index.npz")
+    index.save(path)
+    loaded = IVFIndex.load(path)
+
+    assert loaded.n_lists == 8
+    assert loaded.n_probe == 2
+    idx, _ = index.query(item_representations[0], k=5)
+    loaded_idx, _ = loaded.query(item_representations[0], k=5)
+    assert idx.tolist() == loaded_idx.tolist()
+
+
+def test_evaluate_recall_at_k():
+    rng = np.random.default_rng(0)
+    item_representations = rng.normal(size=(500, 16))
+    index = IVFIndex(n_lists=10, n_probe=2, random_state=0).build(
+        item_representations
+    )
+    queries = item_representations[:20]
+
+    exact = evaluate_recall_at_k(
+        index, item_representations, queries, k=10, n_probe=10
+    )
+    approximate = evaluate_recall_at_k(
+        index, item_representations, queries, k=10
+    )
+    assert exact["recall"] == 1.0
+    assert 0 < approximate["recall"] <= exact["recall"]
+    assert approximate["ann_query_time"] > 0
@@ -0,0 +1,402 @@
+import pickle
+
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.exceptions import NotFittedError
+
+from ds_toolkit.lightfm import (
+    BuyPriceTransformer,
+    BuySpaceTransformer,
+    FeaturesIntoTagsTransformer,
+    FloorTransformer,
+    RentPriceTransformer,
+    RentSpaceTransformer,
+    TagsVocabularyTransformer,
+    YearTransformer,
+    fit_in_chunks,
+    make_features_to_tags_pipeline_buy,
+    make_features_to_tags_pipeline_rent,
+    transform_in_chunks,
+    transform_listing_features,
+)
+
+
+def _make_prices_frame():
+    return pd.DataFrame(
+        {
+            "CATEGORY_CODE": ["APPT"] * 101 + ["INDUS"] * 101 + [None],
+            "PRICE": list(np.arange(101) * 500.0)
+            + list(np.arange(101) * 100.0)
+            + [1e9],
+        }
+    )
+
+
+def _make_listings_frame():
+    return pd.DataFrame(
+        {
+            "LISTING_ID": [1, 2, 3, 4, 5, 6, 7, 8],
+            "CATEGORIES": [
+                "APARTMENT",
+                "FLAT,APARTMENT",
+                "OPEN_SLOT",
+                "DISPLAY_WINDOW",
+                "OFFICE",
+                "HOUSE,SINGLE_HOUSE",
+                "VILLA",
+                "HOME",
+            ],
+            "CATEGORY_CODE": [
+                "APPT",
+                "APPT",
+                "PARK",
+                "INDUS",
+                "INDUS",
+                "HOUSE",
+                "HOUSE",
+                None,
+            ],
+            "PRICE": [2000.0, 45000.0, 150.0, 900.0, 5000.0, 3000.0, None, 1],
+            "SPACE": [80.0, 1.0, 0.5, 0.5, 0.5, 2000.0, 120.0, None],
+            "FLOOR": [3.0, 60.0, None, 0.0, 1.0, None, 2.0, 1.0],
+            "YEARBUILT": [
+                1890.0,
+                1955.0,
+                None,
+                2001.0,
+                2000.0,
+                1920.0,
+                1.0,
+                None,
+            ],
+            "HASGARAGE": [True, None, False, None, True, True, None, None],
+        }
+    )
+
+
+def test_buy_price_transformer():
+    X = _make_prices_frame()
+    transformer = BuyPriceTransformer().fit(X)
+    assert transformer.price_cutoffs_ == {"APPT": 49500.0, "INDUS": 9900.0}
+
+    X = transformer.transform(X)
+    assert X["PRICE"].isna().tolist() == [False] * 100 + [True] + [
+        False
+    ] * 100 + [True, False]
+
+    single = pd.DataFrame({"CATEGORY_CODE": ["INDUS"], "PRICE": [9950.0]})
+    assert transformer.transform(single)["PRICE"].isna().all()
+    unfitted = pd.DataFrame({"CATEGORY_CODE": ["INDUS"], "PRICE": [9950.0]})
+    assert not BuyPriceTransformer().transform(unfitted)["PRICE"].isna().any()
+
+
+def test_rent_price_transformer():
+    X = _make_prices_frame()
+    transformer = RentPriceTransformer().fit(X)
+    assert transformer.price_cutoffs_ == {
+        "APPT": 30000,
+        "HOUSE": 60000,
+        "INDUS": 9900.0,
+    }
+
+    X = transformer.transform(X)
+    assert X["PRICE"].isna().sum() == 40 + 1
+    single = pd.DataFrame({"CATEGORY_CODE": ["HOUSE"], "PRICE": [60001.0]})
+    assert transformer.transform(single)["PRICE"].isna().all()
+
+
+@pytest.mark.parametrize(
+    "transformer_class", [BuyPriceTransformer, RentPriceTransformer]
+)
+def test_price_transformer_categorical_category_code(transformer_class):
+    X = _make_prices_frame()
+    expected = transformer_class().fit(X).transform(X.copy())["PRICE"]
+    X["CATEGORY_CODE"] = pd.Categorical(X["CATEGORY_CODE"])
+
+    fitted = transformer_class().fit(X).transform(X.copy())
+    unfitted = transformer_class().transform(X.copy())
+    assert fitted["PRICE"].isna().tolist() == expected.isna().tolist()
+    assert unfitted["PRICE"].isna().tolist() == expected.isna().tolist()
+
+
+def test_rent_space_transformer():
+    X = RentSpaceTransformer().transform(_make_listings_frame())
+    assert X["SPACE"].dtype == np.float64
+    assert X["SPACE"].isna().tolist() == [
+        False,
+        True,
+        False,
+        False,
+        True,
+        False,
+        False,
+        True,
+    ]
+
+
+def test_buy_space_and_floor_transformers():
+    X = FloorTransformer().transform(
+        BuySpaceTransformer().transform(_make_listings_frame())
+    )
+    assert X["SPACE"].dtype == X["FLOOR"].dtype == np.float64
+    assert X["SPACE"].isna().tolist() == [
+        False,
+        True,
+        False,
+        False,
+        False,
+        False,
+        False,
+        True,
+    ]
+    assert X["FLOOR"].isna().tolist() == [
+        False,
+        True,
+        True,
+        False,
+        False,
+        True,
+        False,
+        False,
+    ]
+
+
+def test_year_transformer():
+    years = [1900.0, 1900.5, 1920.0, 1960.0, 2000.0, 2000.1, np.nan, 1.0]
+    X = YearTransformer().transform(pd.DataFrame({"YEARBUILT": years}))
+    assert "YEARBUILT" not in X.columns
+    assert isinstance(X["YEAR"].dtype, pd.CategoricalDtype)
+    assert X["YEAR"].cat.codes.dtype == np.int8
+    expected = [
+        "ancient",
+        "1901-1920",
+        "1901-1920",
+        "1941-1960",
+        "1981-2000",
+        "modern",
+        None,
+        "ancient",
+    ]
+    assert X["YEAR"].astype(object).where(
+        X["YEAR"].notna(), None
+    ).tolist() == (expected)
+    assert [
+        YearTransformer().transform_record({"YEARBUILT": year})["YEAR"]
+        for year in years
+    ] == expected
+
+    custom = YearTransformer(
+        bins=[-np.inf, 2000, np.inf], labels=["old", "new"]
+    )
+    X = custom.transform(pd.DataFrame({"YEARBUILT": [1999.0, 2001.0]}))
+    assert X["YEAR"].tolist() == ["old", "new"]
+    with pytest.raises(ValueError):
+        YearTransformer(bins=[0, 1]).transform_record({"YEARBUILT": 1.0})
+
+
+def test_features_into_tags_transformer():
+    X = pd.DataFrame(
+        {
+            "LISTING_ID": [1, 2, 3],
+            "CATEGORY_CODE": ["APPT", None, "APPT"],
+            "PRICE": [2000.0, np.nan, 1500.5],
+            "HASGARAGE": [True, None, False],
+            "POSTALCODE": [8001, 8002, 8001],
+        }
+    )
+    assert FeaturesIntoTagsTransformer().transform(X) == [
+        (
+            1,
+            [
+                "CATEGORY_CODE:APPT",
+                "PRICE:2000.0",
+                "HASGARAGE:True",
+                "POSTALCODE:8001",
+            ],
+        ),
+        (2, ["POSTALCODE:8002"]),
+        (
+            3,
+            [
+                "CATEGORY_CODE:APPT",
+                "PRICE:1500.5",
+                "HASGARAGE:False",
+                "POSTALCODE:8001",
+            ],
+        ),
+    ]
+
+    vocabulary = {"CATEGORY_CODE:APPT": 0, "HASGARAGE:True": 1}
+    transformer = FeaturesIntoTagsTransformer(vocabulary=vocabulary)
+    assert transformer.transform(X) == [(1, [0, 1]), (2, []), (3, [0])]
+    assert transformer.transform_record(X.iloc[0].to_dict()) == (1, [0, 1])
+
+
+def test_features_into_tags_transformer_mixed_types():
+    X = pd.DataFrame(
+        {
+            "LISTING_ID": [1, 2, 3],
+            "F": pd.Series([1, 1.0, None], dtype=object),
+            "G": pd.Series([True, 1, 1], dtype=object),
+        }
+    )
+    transformer = FeaturesIntoTagsTransformer()
+    expected = [(1, ["F:1", "G:True"]), (2, ["F:1.0", "G:1"]), (3, ["G:1"])]
+    assert transformer.transform(X) == expected
+    assert [
+        transformer.transform_record(record)
+        for record in X.to_dict(orient="records")
+    ] == expected
+
+
+def test_transform_listing_features():
+    for make_pipeline in [
+        make_features_to_tags_pipeline_buy,
+        make_features_to_tags_pipeline_rent,
+    ]:
+        pipeline = make_pipeline().fit(_make_listings_frame())
+        expected = pipeline.transform(_make_listings_frame())
+        records = _make_listings_frame().to_dict(orient="records")
+        assert [
+            transform_listing_features(pipeline, record) for record in records
+        ] == expected
+
+        loaded = pickle.loads(pickle.dumps(pipeline))
+        assert loaded.steps[0][1].price_cutoffs_ == (
+            pipeline.steps[0][1].price_cutoffs_
+        )
+        assert transform_listing_features(loaded, records[1]) == expected[1]
+
+
+def test_transform_integer_columns():
+    frame = _make_listings_frame()
+    frame["PRICE"] = [2000, 45000, 150, 900, 5000, 3000, 4000, 1]
+    frame["SPACE"] = [80, 1, 0, 0, 0, 2000, 120, 50]
+    frame["FLOOR"] = [3, 60, 0, 0, 1, 2, 2, 1]
+    for make_pipeline in [
+        make_features_to_tags_pipeline_buy,
+        make_features_to_tags_pipeline_rent,
+    ]:
+        pipeline = make_pipeline().fit(frame.copy())
+        expected = pipeline.transform(frame.copy())
+        assert "PRICE:2000" in expected[0][1]
+        assert "SPACE:80" in expected[0][1]
+        assert "FLOOR:3" in expected[0][1]
+        records = frame.to_dict(orient="records")
+        assert [
+            transform_listing_features(pipeline, record) for record in records
+        ] == expected
+
+
+def test_tags_vocabulary_transformer():
+    listings_features = [
+        (1, ["CATEGORY_CODE:APPT", "FLOOR:3.0"]),
+        (2, []),
+        (3, ["CATEGORY_CODE:HOUSE", "FLOOR:3.0", "YEAR:modern"]),
+    ]
+    transformer = TagsVocabularyTransformer().fit(listings_features)
+    assert transformer.vocabulary_ == {
+        "CATEGORY_CODE:APPT": 0,
+        "CATEGORY_CODE:HOUSE": 1,
+        "FLOOR:3.0": 2,
+        "YEAR:modern": 3,
+    }
+
+    item_features = transformer.transform(
+        listings_features + [(4, ["FLOOR:3.0", "YEAR:unknown"])]
+    )
+    assert item_features.shape == (4, 4)
+    assert item_features.indices.dtype == np.int32
+    assert item_features.toarray().tolist() == [
+        [1, 0, 1, 0],
+        [0, 0, 0, 0],
+        [0, 1, 1, 1],
+        [0, 0, 1, 0],
+    ]
+
+    fixed = TagsVocabularyTransformer(vocabulary={"FLOOR:3.0": 0})
+    assert fixed.fit(listings_features).vocabulary_ == {"FLOOR:3.0": 0}
+
+
+def test_tags_vocabulary_transformer_partial_fit():
+    transformer = TagsVocabularyTransformer().fit(
+        [(1, ["FLOOR:3.0", "CATEGORY_CODE:APPT"])]
+    )
+    transformer.partial_fit(
+        [(2, ["YEAR:modern", "FLOOR:3.0"]), (3, ["CATEGORY_CODE:HOUSE"])]
+    )
+    assert transformer.new_tags_ == ["CATEGORY_CODE:HOUSE", "YEAR:modern"]
+    assert transformer.vocabulary_ == {
+        "CATEGORY_CODE:APPT": 0,
+        "FLOOR:3.0": 1,
+        "CATEGORY_CODE:HOUSE": 2,
+        "YEAR:modern": 3,
+    }
+
+    transformer.partial_fit([(4, ["FLOOR:3.0"])])
+    assert transformer.new_tags_ == []
+    assert len(transformer.vocabulary_) == 4
+
+    unfitted = TagsVocabularyTransformer(vocabulary={"FLOOR:3.0": 0})
+    unfitted.partial_fit([(1, ["FLOOR:3.0", "FLOOR:4.0"])])
+    assert unfitted.vocabulary_ == {"FLOOR:3.0": 0, "FLOOR:4.0": 1}
+    assert unfitted.vocabulary == {"FLOOR:3.0": 0}
+
+    with_gaps = TagsVocabularyTransformer(vocabulary={"a": 0, "b": 2})
+    with_gaps.partial_fit([(1, ["c", "b"])])
+    assert with_gaps.vocabulary_ == {"a": 0, "b": 2, "c": 3}
+    matrix = with_gaps.transform([(1, ["a", "b", "c"])])
+    assert matrix.shape == (1, 4)
+    assert matrix.indices.tolist() == [0, 2, 3]
+
+
+def test_transform_in_chunks():
+    X = _make_listings_frame()
+    chunks = [X.iloc[i : i + 3].copy() for i in range(0, len(X), 3)]
+    pipeline = make_features_to_tags_pipeline_rent()
+
+    with pytest.raises(NotFittedError):
+        transform_in_chunks(pipeline, chunks)
+
+    fit_in_chunks(pipeline, iter(chunks))
+    expected = make_features_to_tags_pipeline_rent().fit_transform(X.copy())
+    assert pipeline.steps[0][1].price_cutoffs_ == (
+        RentPriceTransformer().fit(X).price_cutoffs_
+    )
+    assert list(transform_in_chunks(pipeline, iter(chunks))) == expected
+
+
+def test_fit_in_chunks_prices():
+    X = _make_prices_frame()
+    chunks = [X.iloc[i : i + 50].copy() for i in range(0, len(X), 50)]
+    pipeline = make_features_to_tags_pipeline_buy()
+
+    fit_in_chunks(pipeline, iter(chunks))
+    assert pipeline.steps[0][1].price_cutoffs_ == (
+        BuyPriceTransformer().fit(X).price_cutoffs_
+    )
+
+
+def test_fit_in_chunks_many_categories():
+    X = pd.DataFrame(
+        {
+            "CATEGORY_CODE": [f"CATEGORY_{i}" for i in range(200)] * 5,
+            "PRICE": np.arange(1000) * 10.0,
+        }
+    )
+    chunks = [X.iloc[i : i + 300].copy() for i in range(0, len(X), 300)]
+    pipeline = make_features_to_tags_pipeline_buy()
+
+    fit_in_chunks(pipeline, iter(chunks))
+    assert pipeline.steps[0][1].price_cutoffs_ == (
+        BuyPriceTransformer().fit(X).price_cutoffs_
+    )
+
+
+def test_fit_in_chunks_without_price_transformer():
+    pipeline = make_features_to_tags_pipeline_rent()
+    pipeline.steps = pipeline.steps[1:]
+
+    with pytest.raises(ValueError):
+        fit_in_chunks(pipeline, iter([_make_listings_frame()]))
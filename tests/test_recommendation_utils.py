@@ -2,17 +2,31 @@ import json
 from unittest import mock
 
 import numpy as np
+import pytest
 
 from ds_toolkit.recommendations_utils import (
+    CompactRecommendations,
+    GeoIndex,
+    SimilarityEngine,
+    build_category_index,
     coalesce,
+    compile_path,
     convert_to_float,
     convert_to_int,
     deep_get,
+    deep_get_many,
+    encode_categories,
+    filter_scores_below_treshold,
+    get_acceptable_recommendations_mask,
+    get_cosine_similarity,
     get_listing_features,
+    get_listing_features_columns,
     get_recommendations_ordered_by_distance,
     is_acceptable_recommendation,
     isnull,
+    merge_recommendations_ordered_by_distance,
     normalise_price,
+    normalise_price_columns,
 )
 
 
@@ -59,6 +73,132 @@ def test_is_acceptable_recommendation(mock_distance):
     )
 
 
+def test_get_acceptable_recommendations_mask():
+    rng = np.random.default_rng(0)
+    categories_pool = ["HOUSE", "SINGLE_HOUSE", "VILLA", "GARAGE", "FLAT"]
+    source_listing = {
+        "LATITUDE": 47.3769,
+        "LONGITUDE": 8.5417,
+        "CATEGORIES": "HOUSE,SINGLE_HOUSE",
+    }
+    targets = [
+        {
+            "LATITUDE": 47.3769 + rng.uniform(-0.3, 0.3),
+            "LONGITUDE": 8.5417 + rng.uniform(-0.3, 0.3),
+            "CATEGORIES": ",".join(
+                rng.choice(categories_pool, rng.integers(1, 3))
+            ),
+            "IS_ACTIVE": bool(rng.integers(0, 2)),
+        }
+        for _ in range(500)
+    ]
+    category_index = build_category_index(t["CATEGORIES"] for t in targets)
+
+    mask = get_acceptable_recommendations_mask(
+        source_listing,
+        20.0,
+        np.array([t["LATITUDE"] for t in targets]),
+        np.array([t["LONGITUDE"] for t in targets]),
+        np.array([t["IS_ACTIVE"] for t in targets]),
+        encode_categories((t["CATEGORIES"] for t in targets), category_index),
+        category_index,
+    )
+    expected = [
+        bool(is_acceptable_recommendation(source_listing, 20.0, t))
+        for t in targets
+    ]
+    assert mask.tolist() == expected
+    assert 0 < mask.sum() < len(targets)
+
+
+def test_geo_index():
+    listings_features = [
+        {"LATITUDE": 47.3769, "LONGITUDE": 8.5417},
+        {"LATITUDE": 47.3900, "LONGITUDE": 8.5100},
+        {"LATITUDE": None, "LONGITUDE": None},
+        {"LATITUDE": 46.2044, "LONGITUDE": 6.1432},
+        {"LATITUDE": 47.5596, "LONGITUDE": 7.5886},
+    ]
+    geo_index = GeoIndex(listings_features)
+
+    assert geo_index.query_radius(47.3769, 8.5417, 10.0).tolist() == [0, 1]
+    assert geo_index.query_radius(47.3769, 8.5417, 100.0).tolist() == [
+        0,
+        1,
+        4,
+    ]
+    assert geo_index.query_radius(46.2044, 6.1432, 1.0).tolist() == [3]
+
+
+def test_geo_index_without_coordinates():
+    for listings_features in [
+        [],
+        [{"LATITUDE": None, "LONGITUDE": None}] * 2,
+    ]:
+        geo_index = GeoIndex(listings_features)
+        rows = geo_index.query_radius(47.3769, 8.5417, 10.0)
+
+        assert rows.tolist() == []
+        assert rows.dtype == np.intp
+
+
+def test_similarity_engine():
+    rng = np.random.default_rng(0)
+    item_representations = rng.normal(size=(300, 8))
+    item_representations[:, 0] += 3
+    engine = SimilarityEngine(item_representations, dtype=np.float64)
+
+    for source_idx in [0, 10, 299]:
+        source_vector = item_representations[source_idx]
+        expected = filter_scores_below_treshold(
+            get_cosine_similarity(source_vector, item_representations)
+        )
+        idx, scores = engine.get_top_k(source_vector, k=20)
+        assert idx.tolist() == expected[:20].tolist()
+        assert np.all(np.diff(scores) <= 0)
+        assert np.all(scores > 0.8)
+
+    candidates = np.arange(0, 300, 2)
+    idx, _ = engine.get_top_k(
+        item_representations[0], k=5, candidates=candidates
+    )
+    assert np.all(idx % 2 == 0)
+    assert 0 not in idx
+
+    engine_32 = SimilarityEngine(item_representations)
+    assert engine_32.item_vectors.dtype == np.float32
+    idx_32, _ = engine_32.get_top_k(item_representations[0], k=5)
+    assert len(idx_32) == 5
+
+
+def test_similarity_engine_get_top_k_batch():
+    rng = np.random.default_rng(1)
+    item_representations = rng.normal(size=(200, 8))
+    item_representations[:, 0] += 3
+    engine = SimilarityEngine(item_representations, dtype=np.float64)
+
+    top_idx, top_scores = engine.get_top_k_batch(None, k=10, block_size=32)
+    assert top_idx.shape == top_scores.shape == (200, 10)
+    for source_idx, source_vector in enumerate(item_representations):
+        expected = filter_scores_below_treshold(
+            get_cosine_similarity(source_vector, item_representations)
+        )[:10]
+        row = top_idx[source_idx]
+        assert row[row >= 0].tolist() == expected.tolist()
+        assert np.isnan(top_scores[source_idx][row < 0]).all()
+
+    batch_idx, _ = engine.get_top_k_batch(
+        item_representations[:5] * 2, k=10, block_size=2
+    )
+    assert batch_idx.tolist() == top_idx[:5].tolist()
+
+    sparse_idx, sparse_scores = engine.get_top_k_batch(
+        None, k=10, threshold=0.99
+    )
+    assert (sparse_idx == -1).any()
+    assert np.all(sparse_scores[sparse_idx >= 0] > 0.99)
+
+
 def test_get_recommendations_ordered_by_distance():
     recommended_listing_ids_map = {
         1: [(20, 0.1), (30, 0.3)],
@@ -76,6 +216,80 @@ def test_get_recommendations_ordered_by_distance():
     ) == [50, 20, 60, 30]
 
 
+def test_merge_recommendations_ordered_by_distance():
+    recommended_listing_ids_map = {
+        1: [(20, 0.1), (30, 0.3)],
+        2: [(50, 0.05), (20, 0.3)],
+        3: [(60, 0.2)],
+    }
+    for listing_ids in [[1], [2], [1, 2, 3], [3, 4]]:
+        for reverse in [False, True]:
+            assert merge_recommendations_ordered_by_distance(
+                recommended_listing_ids_map, listing_ids, reverse=reverse
+            ) == get_recommendations_ordered_by_distance(
+                recommended_listing_ids_map, listing_ids, reverse=reverse
+            )
+    assert merge_recommendations_ordered_by_distance(
+        recommended_listing_ids_map, [1, 2, 3], limit=2
+    ) == [50, 20]
+    assert (
+        merge_recommendations_ordered_by_distance(
+            recommended_listing_ids_map, [1, 2, 3], limit=0
+        )
+        == []
+    )
+
+
+def test_merge_recommendations_ordered_by_distance_ties():
+    rng = np.random.default_rng(0)
+    for _ in range(200):
+        recommended_listing_ids_map = {
+            listing_id: sorted(
+                zip(
+                    rng.integers(0, 20, 6).tolist(),
+                    rng.integers(0, 3, 6).tolist(),
+                ),
+                key=lambda id_dist: id_dist[1],
+            )
+            for listing_id in range(4)
+        }
+        for reverse in [False, True]:
+            assert merge_recommendations_ordered_by_distance(
+                recommended_listing_ids_map, range(4), reverse=reverse
+            ) == get_recommendations_ordered_by_distance(
+                recommended_listing_ids_map, range(4), reverse=reverse
+            )
+
+
+def test_compact_recommendations(tmp_path):
+    recommended_listing_ids_map = {
+        1: [(20, 0.125), (30, 0.25)],
+        3: [(60, 0.5)],
+        2: [(50, 0.0625), (20, 0.25)],
+        4: [],
+    }
+    compact = CompactRecommendations.from_dict(recommended_listing_ids_map)
+
+    assert len(compact) == 4
+    assert 3 in compact
+    assert 5 not in compact
+    assert compact.get(1, []) == [(20, 0.125), (30, 0.25)]
+    assert compact[4] == []
+    assert compact.get(5, []) == []
+    assert compact.get("1") is None
+    assert get_recommendations_ordered_by_distance(
+        compact, [1, 2, 3, 5]
+    ) == get_recommendations_ordered_by_distance(
+        recommended_listing_ids_map, [1, 2, 3, 5]
+    )
+
+    compact.save(str(tmp_path))
+    loaded = CompactRecommendations.load(str(tmp_path))
+    assert isinstance(loaded.ids, np.memmap)
+    for listing_id, recommendations in recommended_listing_ids_map.items():
+        assert loaded[listing_id] == recommendations
+
+
 def test_deep_get():
     assert deep_get({"a": {"b": 10}}, "a.b") == 10
     assert deep_get({"a": {"b": 10}}, "c.b") is None
@@ -84,6 +298,19 @@ def test_deep_get():
     assert deep_get({"a": {"b": 10}}, "c", "D") == "D"
 
 
+def test_compile_path():
+    assert compile_path("a.b.c") == ("a", "b", "c")
+    assert compile_path("a/b", "/") == ("a", "b")
+    assert compile_path("a.b.c") is compile_path("a.b.c")
+
+
+def test_deep_get_many():
+    input_dict = {"a": {"b": {"c": 1, "d": 2}}}
+    assert deep_get_many(input_dict, "a.b", ("c", "d", "e")) == [1, 2, None]
+    assert deep_get_many(input_dict, "a.x", ("c", "d"), "D") == ["D", "D"]
+    assert deep_get_many(input_dict, "a", ("b",)) == [{"c": 1, "d": 2}]
+
+
 def test_isnull():
     assert isnull(None)
     assert isnull(np.nan)
@@ -126,6 +353,73 @@ def test_normalise_price():
     assert normalise_price(listing_data) == 3033.33
 
 
+def test_normalise_price_columns():
+    rng = np.random.default_rng(0)
+    n_listings = 5000
+
+    def choice(values):
+        return [values[i] for i in rng.integers(0, len(values), n_listings)]
+
+    def numbers(scale, null_rate=0.3):
+        values = rng.uniform(-0.1, 1, n_listings) * scale
+        values[rng.random(n_listings) < null_rate] = np.nan
+        return np.round(values, rng.integers(0, 3))
+
+    columns = {
+        "offer_type": choice(["RENT", "BUY", None]),
+        "rent_interval": choice(["DAY", "WEEK", "MONTH", "ONETIME", "YEAR"]),
+        "rent_area": choice(["ALL", "M2", "KM2", None]),
+        "rent_gross": numbers(5000),
+        "buy_price": numbers(1e6),
+        "buy_area": choice(["ALL", "M2", None, np.nan]),
+        "living_space": numbers(200, 0.6),
+        "total_floor_space": numbers(200, 0.6),
+        "lot_size": numbers(1000, 0.6),
+    }
+    prices, errors = normalise_price_columns(**columns)
+
+    def value(name, row):
+        v = columns[name][row]
+        return None if isinstance(v, float) and np.isnan(v) else v
+
+    for row in range(n_listings):
+        listing_info = {
+            "id": row,
+            "listing": {
+                "offerType": value("offer_type", row),
+                "characteristics": {
+                    "livingSpace": value("living_space", row),
+                    "totalFloorSpace": value("total_floor_space", row),
+                    "lotSize": value("lot_size", row),
+                },
+                "prices": {
+                    "rent": {
+                        "area": value("rent_area", row),
+                        "gross": value("rent_gross", row),
+                        "interval": value("rent_interval", row),
+                    },
+                    "buy": {
+                        "area": columns["buy_area"][row],
+                        "price": value("buy_price", row),
+                    },
+                },
+            },
+        }
+        try:
+            expected = normalise_price(listing_info)
+        except ValueError:
+            assert errors[row]
+            assert np.isnan(prices[row])
+            continue
+        assert not errors[row]
+        if expected is None:
+            assert np.isnan(prices[row])
+        else:
+            assert prices[row] == expected
+    assert errors.any()
+    assert not np.isnan(prices).all()
+
+
 def test_get_listing_features():
     with open("tests/listing.json", "r") as listing_file:
         listing_data = json.loads(listing_file.read())
@@ -173,3 +467,37 @@ def test_get_listing_features():
     assert listing_features["CANTON"] == "NE"
     assert listing_features["CATEGORIES"] == "HOUSE,SINGLE_HOUSE"
     assert listing_features["CATEGORY_CODE"] == "HOUSE"
+
+
+def test_get_listing_features_columns():
+    listings_data = []
+    for path in [
+        "tests/listing.json",
+        "tests/rent_m2_y.json",
+        "tests/rent_all_w.json",
+    ]:
+        with open(path, "r") as listing_file:
+            listings_data.append(json.loads(listing_file.read()))
+    columns = get_listing_features_columns(iter(listings_data), 3)
+
+    assert columns["LISTING_ID"].dtype == np.int64
+    assert columns["PRICE"].dtype == np.float64
+    assert columns["CANTON"].dtype == object
+    for row, listing_data in enumerate(listings_data):
+        listing_features = get_listing_features(listing_data)
+        assert list(listing_features) == list(columns)
+        for feature, value in listing_features.items():
+            if value is None and columns[feature].dtype == np.float64:
+                assert np.isnan(columns[feature][row])
+            else:
+                assert columns[feature][row] == value
+
+
+def test_get_listing_features_columns_length_mismatch():
+    with open("tests/listing.json", "r") as listing_file:
+        listing_data = json.loads(listing_file.read())
+
+    with pytest.raises(ValueError):
+        get_listing_features_columns(iter([listing_data] * 3), 2)
+    with pytest.raises(ValueError):
+        get_listing_features_columns(iter([listing_data] * 2), 3)
@@ -0,0 +1,76 @@
+import numpy as np
+
+from ds_toolkit.recommendations_builder import build_model_id_to_ids
+from ds_toolkit.recommendations_utils import (
+    filter_scores_below_treshold,
+    get_cosine_similarity,
+    get_recommendations_ordered_by_distance,
+    is_acceptable_recommendation,
+)
+
+
+def _make_catalogue(n_listings=120, seed=0):
+    rng = np.random.default_rng(seed)
+    item_representations = rng.normal(size=(n_listings, 6))
+    item_representations[:, 0] += 3
+    listings = [
+        {
+            "LISTING_ID": 1000 + i,
+            "LATITUDE": 47.0 + rng.uniform(-0.2, 0.2),
+            "LONGITUDE": 8.0 + rng.uniform(-0.2, 0.2),
+            "CATEGORIES": str(rng.choice(["HOUSE", "APARTMENT,FLAT", "FLAT"])),
+            "IS_ACTIVE": bool(rng.integers(0, 4)),
+        }
+        for i in range(n_listings)
+    ]
+    return item_representations, listings
+
+
+def test_build_model_id_to_ids():
+    item_representations, listings = _make_catalogue()
+
+    model_id_to_ids = build_model_id_to_ids(
+        item_representations,
+        listings,
+        max_geo_distance=15.0,
+        k=10,
+        n_candidates=len(listings),
+        n_workers=1,
+        chunk_size=50,
+    )
+    assert len(model_id_to_ids) == len(listings)
+    for source_idx in [0, 7, 119]:
+        source_listing = listings[source_idx]
+        similar_idx = filter_scores_below_treshold(
+            get_cosine_similarity(
+                item_representations[source_idx], item_representations
+            )
+        )
+        expected = [
+            listings[i]["LISTING_ID"]
+            for i in similar_idx
+            if is_acceptable_recommendation(source_listing, 15.0, listings[i])
+        ][:10]
+        recommendations = model_id_to_ids[source_listing["LISTING_ID"]]
+        assert [listing_id for listing_id, _ in recommendations] == expected
+        distances = [distance for _, distance in recommendations]
+        assert distances == sorted(distances)
+        assert (
+            get_recommendations_ordered_by_distance(
+                model_id_to_ids, [source_listing["LISTING_ID"]]
+            )
+            == expected
+        )
+
+
+def test_build_model_id_to_ids_multiprocess():
+    item_representations, listings = _make_catalogue()
+    kwargs = {"max_geo_distance": 15.0, "k": 10, "chunk_size": 16}
+
+    single = build_model_id_to_ids(
+        item_representations, listings, n_workers=1, **kwargs
+    )
+    multi = build_model_id_to_ids(
+        item_representations, listings, n_workers=2, **kwargs
+    )
+    assert multi == single
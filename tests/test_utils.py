@@ -1,9 +1,24 @@
+import gc
+import gzip
+import io
+import json
+import pickle
+import threading
 from unittest import mock
 
+import botocore.session
+import numpy as np
+import pytest
+from botocore.stub import ANY, Stubber
+
 from ds_toolkit.utils import (
+    MIN_PART_SIZE,
     ObjectFormat,
+    S3MultipartWriter,
+    download_s3_object_into_buffer,
     dump_object_to_s3,
     load_object_from_s3,
+    register_compression_codec,
     send_datadog_metric,
 )
 
@@ -115,3 +130,531 @@ def test_load_json_object_from_s3(mock_loads):
     )
     mock_obj.read.assert_called_once_with()
     mock_loads.assert_called_once_with("pickled_obj")
+
+
+def _make_multipart_client():
+    mock_client = mock.MagicMock()
+    mock_client.create_multipart_upload.return_value = {"UploadId": "id"}
+    mock_client.upload_part.side_effect = lambda **kwargs: {
+        "ETag": f"etag-{kwargs['PartNumber']}"
+    }
+    return mock_client
+
+
+def _uploaded_body(mock_client):
+    return b"".join(
+        call.kwargs["Body"] for call in mock_client.upload_part.call_args_list
+    )
+
+
+def test_dump_object_to_s3_multipart():
+    mock_client = _make_multipart_client()
+    obj = {"payload": bytes(range(256)) * 50000}
+
+    dump_object_to_s3(
+        mock_client, obj, "bucket", "key", part_size=MIN_PART_SIZE
+    )
+    part_sizes = [
+        len(call.kwargs["Body"])
+        for call in mock_client.upload_part.call_args_list
+    ]
+    assert len(part_sizes) == 3
+    assert part_sizes[:2] == [MIN_PART_SIZE, MIN_PART_SIZE]
+    assert pickle.loads(_uploaded_body(mock_client)) == obj
+    mock_client.put_object.assert_not_called()
+    mock_client.complete_multipart_upload.assert_called_once_with(
+        Bucket="bucket",
+        Key="key",
+        UploadId="id",
+        MultipartUpload={
+            "Parts": [
+                {"ETag": f"etag-{i}", "PartNumber": i} for i in (1, 2, 3)
+            ]
+        },
+    )
+
+
+def test_dump_json_object_to_s3_multipart():
+    mock_client = _make_multipart_client()
+    obj = {"a": [1, 2, 3], "b": "é"}
+
+    dump_object_to_s3(
+        mock_client,
+        obj,
+        "bucket",
+        "key",
+        ObjectFormat.JSON,
+        part_size=MIN_PART_SIZE,
+    )
+    mock_client.upload_part.assert_called_once()
+    assert json.loads(_uploaded_body(mock_client)) == obj
+
+
+def test_dump_object_to_s3_multipart_aborts_on_error():
+    mock_client = _make_multipart_client()
+
+    with pytest.raises(TypeError):
+        dump_object_to_s3(
+            mock_client,
+            {"lock": threading.Lock()},
+            "bucket",
+            "key",
+            part_size=MIN_PART_SIZE,
+        )
+    mock_client.abort_multipart_upload.assert_called_once_with(
+        Bucket="bucket", Key="key", UploadId="id"
+    )
+    mock_client.complete_multipart_upload.assert_not_called()
+
+
+def test_s3_multipart_writer_with_stubber():
+    client = botocore.session.get_session().create_client(
+        "s3",
+        region_name="us-east-1",
+        aws_access_key_id="key",
+        aws_secret_access_key="secret",
+    )
+    bucket_key = {"Bucket": "bucket", "Key": "key"}
+    with Stubber(client) as stubber:
+        stubber.add_response(
+            "create_multipart_upload",
+            {"UploadId": "id"},
+            bucket_key,
+        )
+        for part_number in (1, 2):
+            stubber.add_response(
+                "upload_part",
+                {"ETag": f"etag-{part_number}"},
+                {
+                    **bucket_key,
+                    "Body": ANY,
+                    "PartNumber": part_number,
+                    "UploadId": "id",
+                },
+            )
+        stubber.add_response(
+            "complete_multipart_upload",
+            {},
+            {
+                **bucket_key,
+                "UploadId": "id",
+                "MultipartUpload": {
+                    "Parts": [
+                        {"ETag": "etag-1", "PartNumber": 1},
+                        {"ETag": "etag-2", "PartNumber": 2},
+                    ]
+                },
+            },
+        )
+        with S3MultipartWriter(client, "bucket", "key", MIN_PART_SIZE) as w:
+            w.write(b"x" * (MIN_PART_SIZE + 1))
+        stubber.assert_no_pending_responses()
+
+
+def test_s3_multipart_writer_rejects_small_parts():
+    with pytest.raises(ValueError):
+        S3MultipartWriter(mock.MagicMock(), "bucket", "key", 1024)
+
+
+def _make_ranged_client(data):
+    def get_object(Bucket, Key, Range, IfMatch):
+        start, end = map(int, Range[len("bytes=") :].split("-"))
+        body = mock.MagicMock()
+        body.read.return_value = data[start : end + 1]
+        return {"Body": body}
+
+    mock_client = mock.MagicMock()
+    mock_client.head_object.return_value = {
+        "ContentLength": len(data),
+        "ETag": "etag",
+    }
+    mock_client.get_object.side_effect = get_object
+    return mock_client
+
+
+def test_download_s3_object_into_buffer():
+    data = bytes(range(256)) * 40
+    mock_client = _make_ranged_client(data)
+
+    buffer = download_s3_object_into_buffer(
+        mock_client, "bucket", "key", part_size=1000, max_concurrency=4
+    )
+    assert isinstance(buffer, bytearray)
+    assert buffer == data
+    ranges = sorted(
+        call.kwargs["Range"] for call in mock_client.get_object.call_args_list
+    )
+    assert len(ranges) == 11
+    assert "bytes=10000-10239" in ranges
+    assert all(
+        call.kwargs["IfMatch"] == "etag"
+        for call in mock_client.get_object.call_args_list
+    )
+
+
+def test_download_empty_s3_object_into_buffer():
+    mock_client = _make_ranged_client(b"")
+
+    assert download_s3_object_into_buffer(mock_client, "bucket", "key") == b""
+    mock_client.get_object.assert_not_called()
+
+
+@pytest.mark.parametrize(
+    "format, data",
+    [
+        (ObjectFormat.PICKLE, pickle.dumps({"a": list(range(1000))})),
+        (ObjectFormat.JSON, json.dumps({"a": list(range(1000))}).encode()),
+    ],
+)
+def test_load_object_from_s3_parallel(format, data):
+    mock_client = _make_ranged_client(data)
+
+    obj = load_object_from_s3(
+        mock_client, "bucket", "key", format, part_size=512
+    )
+    assert obj == {"a": list(range(1000))}
+    mock_client.head_object.assert_called_once_with(Bucket="bucket", Key="key")
+
+
+def _make_get_object_client(data):
+    mock_client = mock.MagicMock()
+    mock_client.get_object.return_value = {"Body": mock.MagicMock()}
+    mock_client.get_object.return_value["Body"].read.return_value = data
+    return mock_client
+
+
+@pytest.mark.parametrize(
+    "array",
+    [
+        np.arange(12, dtype=np.float32).reshape(3, 4),
+        np.asfortranarray(np.arange(12).reshape(3, 4)),
+        np.zeros((0, 3)),
+        np.array(["a", "bc"]),
+    ],
+)
+def test_dump_and_load_numpy_array(array):
+    mock_client = mock.MagicMock()
+    dump_object_to_s3(mock_client, array, "bucket", "key", ObjectFormat.NUMPY)
+    data = mock_client.put_object.call_args.kwargs["Body"].read()
+
+    loaded = load_object_from_s3(
+        _make_get_object_client(data), "bucket", "key", ObjectFormat.NUMPY
+    )
+    np.testing.assert_array_equal(loaded, array)
+    assert loaded.dtype == array.dtype
+    if array.size:
+        assert np.shares_memory(loaded, np.frombuffer(data, dtype=np.uint8))
+
+    loaded = load_object_from_s3(
+        _make_ranged_client(data),
+        "bucket",
+        "key",
+        ObjectFormat.NUMPY,
+        part_size=64,
+    )
+    np.testing.assert_array_equal(loaded, array)
+    assert loaded.flags.writeable
+
+
+def test_dump_and_load_numpy_arrays_multipart():
+    arrays = {"ids": np.arange(10), "vectors": np.ones((10, 4), np.float32)}
+    mock_client = _make_multipart_client()
+    dump_object_to_s3(
+        mock_client,
+        arrays,
+        "bucket",
+        "key",
+        ObjectFormat.NUMPY,
+        part_size=MIN_PART_SIZE,
+    )
+
+    loaded = load_object_from_s3(
+        _make_get_object_client(_uploaded_body(mock_client)),
+        "bucket",
+        "key",
+        ObjectFormat.NUMPY,
+    )
+    assert loaded.keys() == arrays.keys()
+    for name, array in arrays.items():
+        np.testing.assert_array_equal(loaded[name], array)
+
+
+class _InMemoryS3Client:
+    def __init__(self):
+        self.objects = {}
+        self.uploads = {}
+
+    def put_object(self, Body, Bucket, Key, Metadata=None):
+        data = Body.read() if hasattr(Body, "read") else bytes(Body)
+        self.objects[Key] = (data, Metadata or {})
+
+    def create_multipart_upload(self, Bucket, Key, Metadata=None):
+        self.uploads[Key] = ([], Metadata or {})
+        return {"UploadId": Key}
+
+    def upload_part(self, Body, Bucket, Key, PartNumber, UploadId):
+        self.uploads[Key][0].append(Body)
+        return {"ETag": str(PartNumber)}
+
+    def complete_multipart_upload(self, Bucket, Key, UploadId, **kwargs):
+        parts, metadata = self.uploads.pop(Key)
+        self.objects[Key] = (b"".join(parts), metadata)
+
+    def head_object(self, Bucket, Key):
+        data, metadata = self.objects[Key]
+        return {
+            "ContentLength": len(data),
+            "ETag": "etag",
+            "Metadata": metadata,
+        }
+
+    def get_object(self, Bucket, Key, Range=None, IfMatch=None):
+        data, metadata = self.objects[Key]
+        if Range is not None:
+            start, end = map(int, Range[len("bytes=") :].split("-"))
+            data = data[start : end + 1]
+        return {"Body": io.BytesIO(data), "Metadata": metadata}
+
+    def list_objects_v2(self, Bucket, Prefix, ContinuationToken=""):
+        keys = sorted(
+            key
+            for key in self.objects
+            if key.startswith(Prefix) and key > ContinuationToken
+        )
+        response = {"Contents": [{"Key": key} for key in keys[:2]]}
+        if len(keys) > 2:
+            response["IsTruncated"] = True
+            response["NextContinuationToken"] = keys[1]
+        return response
+
+    def delete_objects(self, Bucket, Delete):
+        for deleted in Delete["Objects"]:
+            del self.objects[deleted["Key"]]
+
+
+def _get_buffer_keys(client):
+    return sorted(key for key in client.objects if key != "key")
+
+
+@pytest.mark.parametrize("part_size", [None, MIN_PART_SIZE])
+def test_dump_and_load_pickle5_object(part_size):
+    client = _InMemoryS3Client()
+    obj = {
+        "item_embeddings": np.random.rand(200_000, 8),
+        "item_biases": np.random.rand(10),
+        "params": {"no_components": 8},
+    }
+    dump_object_to_s3(
+        client, obj, "bucket", "key", ObjectFormat.PICKLE5, part_size
+    )
+    (buffer_key,) = _get_buffer_keys(client)
+    metadata = client.objects["key"][1]
+    dump_id = metadata["pickle-dump-id"]
+    assert metadata == {"pickle-buffers": "1", "pickle-dump-id": dump_id}
+    assert buffer_key == f"key.buffers/{dump_id}/0"
+    assert client.objects[buffer_key][1] == {"pickle-dump-id": dump_id}
+    assert len(client.objects["key"][0]) < 1024
+    assert client.objects[buffer_key][0] == obj["item_embeddings"].tobytes()
+
+    loaded = load_object_from_s3(
+        client, "bucket", "key", ObjectFormat.PICKLE5, part_size
+    )
+    np.testing.assert_array_equal(
+        loaded["item_embeddings"], obj["item_embeddings"]
+    )
+    np.testing.assert_array_equal(loaded["item_biases"], obj["item_biases"])
+    assert loaded["params"] == obj["params"]
+    assert loaded["item_embeddings"].flags.writeable
+    assert not loaded["item_embeddings"].flags.owndata
+
+
+def test_dump_pickle5_object_deletes_stale_buffers():
+    client = _InMemoryS3Client()
+    arrays = [np.random.rand(200_000) for _ in range(3)]
+    dump_object_to_s3(client, arrays, "bucket", "key", ObjectFormat.PICKLE5)
+    assert len(_get_buffer_keys(client)) == 3
+
+    dump_object_to_s3(
+        client, arrays[:1], "bucket", "key", ObjectFormat.PICKLE5
+    )
+    dump_id = client.objects["key"][1]["pickle-dump-id"]
+    assert _get_buffer_keys(client) == [f"key.buffers/{dump_id}/0"]
+    loaded = load_object_from_s3(client, "bucket", "key", ObjectFormat.PICKLE5)
+    np.testing.assert_array_equal(loaded[0], arrays[0])
+
+
+def test_load_pickle5_object_checks_dump_id():
+    client = _InMemoryS3Client()
+    dump_object_to_s3(
+        client,
+        [np.random.rand(200_000)],
+        "bucket",
+        "key",
+        ObjectFormat.PICKLE5,
+    )
+    (buffer_key,) = _get_buffer_keys(client)
+    data, _ = client.objects[buffer_key]
+    client.objects[buffer_key] = (data, {"pickle-dump-id": "other"})
+
+    with pytest.raises(ValueError):
+        load_object_from_s3(client, "bucket", "key", ObjectFormat.PICKLE5)
+
+
+def test_dump_pickle5_object_streams_large_buffers():
+    client = _InMemoryS3Client()
+    client.put_object = mock.MagicMock(wraps=client.put_object)
+    array = np.random.rand(2 * MIN_PART_SIZE // 8 + 1)
+
+    with mock.patch("ds_toolkit.utils.DEFAULT_PART_SIZE", MIN_PART_SIZE):
+        dump_object_to_s3(client, array, "bucket", "key", ObjectFormat.PICKLE5)
+    assert [
+        call.kwargs["Key"] for call in client.put_object.call_args_list
+    ] == ["key"]
+    (buffer_key,) = _get_buffer_keys(client)
+    assert client.objects[buffer_key][0] == array.tobytes()
+
+
+@pytest.mark.parametrize("compression", ["gzip", "bz2", "lzma"])
+@pytest.mark.parametrize(
+    "format, obj",
+    [
+        (ObjectFormat.PICKLE, {"ids": [1, 2, 3] * 10_000}),
+        (ObjectFormat.JSON, {"ids": [1, 2, 3] * 10_000}),
+        (ObjectFormat.NUMPY, np.zeros((1000, 8), dtype=np.float32)),
+        (ObjectFormat.NUMPY, {"ids": np.zeros(10_000, dtype=np.int64)}),
+    ],
+)
+@pytest.mark.parametrize("part_size", [None, MIN_PART_SIZE])
+def test_dump_and_load_compressed_object(compression, format, obj, part_size):
+    client = _InMemoryS3Client()
+    dump_object_to_s3(
+        client,
+        obj,
+        "bucket",
+        "key",
+        format,
+        part_size=part_size,
+        compression=compression,
+    )
+    data, metadata = client.objects["key"]
+    assert metadata == {"compression": compression}
+    assert len(data) < 2000
+
+    for load_part_size in (None, 1024):
+        loaded = load_object_from_s3(
+            client, "bucket", "key", format, part_size=load_part_size
+        )
+        if isinstance(obj, np.ndarray):
+            np.testing.assert_array_equal(loaded, obj)
+        elif format == ObjectFormat.NUMPY:
+            np.testing.assert_array_equal(loaded["ids"], obj["ids"])
+        else:
+            assert loaded == obj
+
+
+@pytest.mark.parametrize(
+    "format, obj",
+    [
+        (ObjectFormat.PICKLE, {"ids": [1, 2, 3] * 10_000}),
+        (ObjectFormat.NUMPY, {"ids": np.zeros(10_000, dtype=np.int64)}),
+    ],
+)
+def test_load_compressed_object_does_not_copy_buffer(format, obj):
+    client = _InMemoryS3Client()
+    dump_object_to_s3(client, obj, "bucket", "key", format, compression="gzip")
+    data, _ = client.objects["key"]
+    copied_sizes = []
+
+    def bytes_io(initial_bytes=b""):
+        copied_sizes.append(len(initial_bytes))
+        return io.BytesIO(initial_bytes)
+
+    with mock.patch("ds_toolkit.utils.BytesIO", side_effect=bytes_io):
+        loaded = load_object_from_s3(
+            client, "bucket", "key", format, part_size=1024
+        )
+    assert all(size < len(data) for size in copied_sizes)
+    if format == ObjectFormat.NUMPY:
+        np.testing.assert_array_equal(loaded["ids"], obj["ids"])
+    else:
+        assert loaded == obj
+
+
+def test_dump_object_to_s3_unknown_compression():
+    mock_client = mock.MagicMock()
+
+    with pytest.raises(ValueError):
+        dump_object_to_s3(
+            mock_client, {}, "bucket", "key", compression="unknown"
+        )
+    with pytest.raises(ValueError):
+        dump_object_to_s3(
+            mock_client,
+            {},
+            "bucket",
+            "key",
+            ObjectFormat.PICKLE5,
+            compression="gzip",
+        )
+    mock_client.put_object.assert_not_called()
+
+
+def test_register_compression_codec():
+    codec = mock.MagicMock(
+        side_effect=lambda stream, mode: gzip.GzipFile(
+            fileobj=stream, mode=mode
+        )
+    )
+    register_compression_codec("custom", codec)
+    client = _InMemoryS3Client()
+
+    dump_object_to_s3(client, [1, 2], "bucket", "key", compression="custom")
+    assert load_object_from_s3(client, "bucket", "key") == [1, 2]
+    assert [call.args[1] for call in codec.call_args_list] == ["wb", "rb"]
+
+
+def test_s3_multipart_writer_aborts_when_garbage_collected():
+    mock_client = _make_multipart_client()
+    writer = S3MultipartWriter(mock_client, "bucket", "key", MIN_PART_SIZE)
+    writer.write(b"partial")
+
+    del writer
+    gc.collect()
+    mock_client.abort_multipart_upload.assert_called_once_with(
+        Bucket="bucket", Key="key", UploadId="id"
+    )
+    mock_client.complete_multipart_upload.assert_not_called()
+
+
+@pytest.mark.parametrize("failing", ["upload_part", "complete"])
+def test_s3_multipart_writer_aborts_when_close_fails(failing):
+    mock_client = _make_multipart_client()
+    if failing == "upload_part":
+        mock_client.upload_part.side_effect = OSError
+    else:
+        mock_client.complete_multipart_upload.side_effect = OSError
+    writer = S3MultipartWriter(mock_client, "bucket", "key", MIN_PART_SIZE)
+    writer.write(b"data")
+
+    with pytest.raises(OSError):
+        writer.close()
+    assert writer.closed
+    mock_client.abort_multipart_upload.assert_called_once_with(
+        Bucket="bucket", Key="key", UploadId="id"
+    )
+
+    del writer
+    gc.collect()
+    mock_client.abort_multipart_upload.assert_called_once()
+
+
+def test_s3_multipart_writer_closed_is_not_aborted():
+    mock_client = _make_multipart_client()
+    writer = S3MultipartWriter(mock_client, "bucket", "key", MIN_PART_SIZE)
+    writer.write(b"data")
+    writer.close()
+
+    del writer
+    gc.collect()
+    mock_client.complete_multipart_upload.assert_called_once()
+    mock_client.abort_multipart_upload.assert_not_called()